@@ -0,0 +1,55 @@
+import threading
+
+import pandas as pd
+
+KEY_COLUMNS = ['DNI', 'Nombre', 'Nombre Ejercicio', 'Posición Corporal']
+MEASURES = ['Repeticiones', 'Tiempo (min)', 'Kilos']
+
+
+# Monday of the week of each session date (NaT for unparseable dates)
+def week_start(fechas):
+    return pd.to_datetime(fechas, errors='coerce').dt.to_period('W').dt.start_time
+
+
+# Totals of the measures plus the number of sessions per patient, exercise,
+# body position and week (or the given key columns plus week), for one
+# batch of session rows
+def group_totals(df, key_columns=KEY_COLUMNS):
+    keys = pd.DataFrame({column: df[column] if column in df else '' for column in key_columns}, index=df.index)
+    keys = keys.astype(object).fillna('').astype(str)
+    keys['Semana'] = week_start(df['Fecha']) if 'Fecha' in df else pd.NaT
+    values = pd.DataFrame({column: pd.to_numeric(df[column], errors='coerce') if column in df else 0.0
+                           for column in MEASURES}, index=df.index).fillna(0.0)
+    values['Sesiones'] = 1
+    return values.groupby([keys[column] for column in keys.columns], dropna=False).sum()
+
+
+# Running weekly totals of the session table. add_rows folds new sessions
+# into the existing totals, so the shared TableCache keeps it current on
+# every save without rescanning the history.
+class SessionAggregates:
+    def __init__(self, df):
+        self.totals = {}
+        self.lock = threading.Lock()
+        self.frame = None
+        self.add_rows(df)
+
+    def add_rows(self, rows):
+        grouped = group_totals(rows)
+        with self.lock:
+            for key, values in zip(grouped.index, grouped.to_numpy()):
+                current = self.totals.get(key)
+                self.totals[key] = values if current is None else current + values
+            self.frame = None
+
+    def __len__(self):
+        return len(self.totals)
+
+    def to_frame(self):
+        with self.lock:
+            if self.frame is None:
+                index = pd.MultiIndex.from_tuples(list(self.totals), names=KEY_COLUMNS + ['Semana'])
+                self.frame = pd.DataFrame(list(self.totals.values()), index=index,
+                                          columns=MEASURES + ['Sesiones']).reset_index()
+                self.frame['Sesiones'] = self.frame['Sesiones'].astype(int)
+            return self.frame
@@ -2,15 +2,30 @@ import streamlit as st
 import pandas as pd
 import streamlit.components.v1 as components
 from streamlit_option_menu import option_menu
+from ingest import ingest_upload, validate_columns
+from reports import ReportCache
+import auth
+
+# Filas máximas que se muestran en la tabla y se envían a PyGWalker
+PREVIEW_ROWS = 1000
+ANALYSIS_ROWS = 50000
+
+# Columnas esperadas según la plantilla
+@st.cache_data
+def load_template_columns():
+    return list(pd.read_excel("template.xlsx", nrows=0).columns)
+
+# Informes de PyGWalker renderizados, compartidos por todas las sesiones
+@st.cache_resource
+def get_report_cache():
+    # Each upload is rendered on its own: a report is never swapped for another user's file
+    return ReportCache(coalesce=False)
 
 # Función para validar credenciales
 def validate_login(username, password):
-    # Leer el archivo Excel con las credenciales
-    credentials_df = pd.read_excel("admin_credentials.xlsx")
-    # Comprobar si las credenciales son válidas
-    if ((credentials_df['username'] == username) & (credentials_df['password'] == password)).any():
-        return True
-    return False
+    # Almacén de credenciales con hash, cargado una vez y recargado si cambia el archivo
+    credentials = auth.get_store("admin_credentials.xlsx", 'username', 'password')
+    return credentials.verify(username, password)
 
 # Definir la página principal
 def main_page():
@@ -51,17 +66,37 @@ def hr_analytics_page():
     
     if uploaded_file is not None:
         try:
-            if uploaded_file.name.endswith('.csv'):
-                df = pd.read_csv(uploaded_file)
-            else:
-                df = pd.read_excel(uploaded_file)
+            # Read in chunks with compact dtypes; re-uploads of the same file come from the cache
+            progress_bar = st.progress(0.0, text="Cargando archivo...")
+            df, from_cache = ingest_upload(uploaded_file, progress=progress_bar.progress)
+            progress_bar.empty()
+            if from_cache:
+                st.info("Archivo ya analizado: cargado desde la caché.")
+            
+            missing, extra = validate_columns(list(df.columns), load_template_columns())
+            if missing:
+                st.warning(f"Faltan columnas de la plantilla: {', '.join(map(str, missing))}")
+            if extra:
+                st.warning(f"Columnas no incluidas en la plantilla: {', '.join(map(str, extra))}")
             
-            st.write("DataFrame:")
-            st.dataframe(df)
+            st.write(f"DataFrame: {len(df)} filas, {df.memory_usage(deep=True).sum() / 1e6:.1f} MB en memoria")
+            st.dataframe(df.head(PREVIEW_ROWS))
             
             st.subheader("PyGWalker Analysis")
-            pyg_html = pyg.walk(df, env='Streamlit', return_html=True)
-            components.html(pyg_html, scrolling=True, height=600)
+            if len(df) > ANALYSIS_ROWS:
+                st.info(f"Analizando una muestra aleatoria de {ANALYSIS_ROWS} filas.")
+                df = df.sample(n=ANALYSIS_ROWS, random_state=0)
+            # Rendered once per dataset on a background thread and kept on disk;
+            # a previous upload's report is never shown for a different file
+            pyg_html, fresh, future = get_report_cache().lookup('hr_analytics', df)
+            if not fresh:
+                with st.spinner("Generando el análisis..."):
+                    future.result()
+                pyg_html, fresh, _ = get_report_cache().lookup('hr_analytics', df)
+            if fresh:
+                components.html(pyg_html, scrolling=True, height=600)
+            else:
+                st.error("No se ha podido generar el análisis de este archivo; vuelve a intentarlo.")
         except Exception as e:
             st.error(f"Error loading or processing the file: {e}")
 
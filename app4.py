@@ -1,24 +1,61 @@
+import time
+script_started = time.perf_counter()
+
 import streamlit as st
 import pandas as pd
 from datetime import datetime
+import json
+import tempfile
 from streamlit_option_menu import option_menu
 import os
-import requests
 from streamlit_lottie import st_lottie
-from PIL import Image
-import cv2
-import mediapipe as mp
-import pygwalker as pyg
-
-# Función para cargar animaciones Lottie desde una URL
-def load_lottieurl(url):
-    r = requests.get(url)
-    if r.status_code != 200:
-        return None
-    return r.json()
+import storage
+import auth
+from cache import TableCache, file_signature
+from catalogue import load_catalogue
+from indexes import TableIndex
+from aggregates import SessionAggregates
+from startup import lazy_import
+import startup
+import profiling
+import schemas
+
+# cv2, mediapipe (pose_pipeline, batch_pose, pose_metrics), pygwalker and
+# requests are imported with lazy_import by the pages that use them
+
+# Opt-in per-rerun instrumentation (env TECHEALTH_PROFILING=1 or the admin debug panel)
+profiler = profiling.RunProfiler(enabled=profiling.ENABLED or st.session_state.get('perfilado', False))
+profiler.record('imports', time.perf_counter() - script_started)
+profiling.serve_metrics()
 
-# Cargar la animación Lottie
-lottie_coding = load_lottieurl("https://assets5.lottiefiles.com/packages/lf20_0yfsb3a1.json")
+lottie_url = "https://assets5.lottiefiles.com/packages/lf20_0yfsb3a1.json"
+lottie_cache_file = os.path.join('.cache', 'lottie_coding.json')
+
+# Función para cargar animaciones Lottie desde una URL, con copia local en disco.
+# Sin conexión devuelve None en pocos segundos en lugar de bloquear la página.
+# Solo se guarda en disco una respuesta JSON válida; una copia ilegible se
+# trata como si no existiera.
+@st.cache_data(ttl=300, show_spinner=False)
+def load_lottieurl(url, cache_file=lottie_cache_file, timeout=3):
+    try:
+        with open(cache_file, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        pass
+    requests = lazy_import('requests')
+    try:
+        r = requests.get(url, timeout=timeout)
+        if r.status_code != 200:
+            return None
+        animation = r.json()
+    except (requests.RequestException, ValueError):
+        return None
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    tmp_file = cache_file + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(animation, f)
+    os.replace(tmp_file, cache_file)
+    return animation
 
 # Define file paths
 datos_file = 'datos_pacientes.xlsx'
@@ -29,65 +66,117 @@ ejercicios_file = 'ejercicios_pacientes.xlsx'
 credentials_file = 'credentials.xlsx'  # Archivo de credenciales para login
 logo_file = 'TecHealth_Logo.png'
 
-# Load or create the data file
+# Load or create the data file (through the configured storage backend)
 def load_excel(file, columns):
-    if os.path.exists(file):
-        return pd.read_excel(file)
-    else:
-        return pd.DataFrame(columns=columns)
+    return storage.load_table(file, columns)
+
+# Process-wide cache of parsed tables shared by every session and rerun
+@st.cache_resource
+def get_table_cache():
+    return TableCache(max_entries=int(os.environ.get('TECHEALTH_CACHE_ENTRIES', 32)))
+
+table_cache = get_table_cache()
+
+# Materialized weekly progress of every patient, built from the session log
+# the first time so later saves only add to it
+@st.cache_resource
+def get_progress_store():
+    store = lazy_import('progress').ProgressStore()
+    if store.rows() is None:
+        store.rebuild(load_table(datos_file, []))
+    return store
+
+# Multi-station capture service shared by every session: one pool of pose
+# models for all the cameras of the room
+@st.cache_resource
+def get_capture_service(workers):
+    service = lazy_import('stations').CaptureService(workers=workers)
+    service.start()
+    return service
+
+# Process-wide cache of rendered PyGWalker reports
+@st.cache_resource
+def get_report_cache():
+    return lazy_import('reports').ReportCache()
+
+# Cached load, reparsed only when the underlying file changes; known tables
+# are held with compact dtypes (categories, datetime64, small integers)
+def load_table(file, columns):
+    return table_cache.get(('table', file), storage.signature(file), lambda: schemas.normalize(load_excel(file, columns), file))
 
-# Save data to an Excel file
-def save_to_excel(df, file):
-    df.to_excel(file, index=False)
+# Append new rows without rewriting the existing history; when id_column
+# is given the IDs are allocated atomically and the stored rows are returned
+def append_to_excel(df, file, id_column=None, keep_ids=False):
+    rows, before, after = storage.append_rows(schemas.enforce(df, file), file, id_column, keep_ids)
+    table_cache.apply_write(file, before, after, rows)
+    return rows
 
 # Load user credentials file
-@st.cache_data
 def load_credentials(file):
     if os.path.exists(file):
-        return pd.read_excel(file)
+        return table_cache.get(('table', file), file_signature(file), lambda: pd.read_excel(file))
     else:
         st.error(f"File '{file}' not found.")
         return pd.DataFrame(columns=['Nombre', 'DNI'])
 
-# Validate user credentials
-def validate_credentials(nombre, dni, df_credenciales):
-    return not df_credenciales[(df_credenciales['Nombre'] == nombre) & (df_credenciales['DNI'] == dni)].empty
+# Validate user credentials (O(1) lookup by DNI in the credentials index)
+def validate_credentials(nombre, dni, credenciales_index):
+    return (credenciales_index.lookup(dni)['Nombre'] == nombre).any()
 
-# Load login credentials
-@st.cache_data
+# Load login credentials (hashed store indexed by email, reloaded when the file changes)
 def load_login_credentials(file):
-    if os.path.exists(file):
-        return pd.read_excel(file)
-    else:
+    if not os.path.exists(file):
         st.error(f"File '{file}' not found.")
-        return pd.DataFrame(columns=['email', 'password'])
+    return auth.get_store(file, 'email', 'password')
 
 # Validate login credentials
-def check_login_credentials(email, password, df_login_credentials):
-    if email in df_login_credentials['email'].values:
-        stored_password = df_login_credentials.loc[df_login_credentials['email'] == email, 'password'].values[0]
-        if password == stored_password:
-            return True
-    return False
+def check_login_credentials(email, password, login_store):
+    return login_store.verify(email, password)
+
+# Exercise catalogue compiled once per version of the workbook
+def load_exercise_catalogue():
+    return table_cache.get(('catalogue', ejercicios_file), file_signature(ejercicios_file),
+                           lambda: load_catalogue(ejercicios_file))
 
 # Initialize dataframes
-df_datos = load_excel(datos_file, ['Fecha', 'Nombre', 'DNI', 'Posición Corporal', 'Nombre Ejercicio', 'Repeticiones', 'Tiempo (min)', 'Kilos'])
-df_credenciales = load_credentials(credenciales_file)
-df_profesionales = load_excel(profesionales_file, ['ID', 'Nombre', 'Apellidos', 'Direccion', 'DNI', 'Telefono', 'Municipio', 'Codigo Postal', 'Tipo'])
-df_clientes = load_excel(clientes_file, ['ID', 'Nombre', 'Apellidos', 'Direccion', 'DNI', 'Telefono', 'Municipio', 'Codigo Postal'])
-df_ejercicios = load_excel(ejercicios_file, ['POSICIÓN CORPORAL', 'NOMBRE EJERCICIO'])
-df_login_credentials = load_login_credentials(credentials_file)
-
-# Cargar la imagen del logotipo
-try:
-    logo_image = Image.open(logo_file)
-except FileNotFoundError:
-    logo_image = None
+with profiler.stage('load_tables'):
+    df_datos = load_table(datos_file, ['Fecha', 'Nombre', 'DNI', 'Posición Corporal', 'Nombre Ejercicio', 'ID Ejercicio', 'Repeticiones', 'Tiempo (min)', 'Kilos'])
+    df_credenciales = load_credentials(credenciales_file)
+    df_profesionales = load_table(profesionales_file, ['ID', 'Nombre', 'Apellidos', 'Direccion', 'DNI', 'Telefono', 'Municipio', 'Codigo Postal', 'Tipo'])
+    df_clientes = load_table(clientes_file, ['ID', 'Nombre', 'Apellidos', 'Direccion', 'DNI', 'Telefono', 'Municipio', 'Codigo Postal'])
+    ejercicios = load_exercise_catalogue()
+    login_store = load_login_credentials(credentials_file)
+
+# Shared indexes, built once per file version and updated in place by our own writes
+def load_index(file, key_column, columns):
+    return table_cache.get(('index', file, key_column), storage.signature(file),
+                           lambda: TableIndex(load_table(file, columns), key_column))
+
+def load_credentials_index():
+    return table_cache.get(('index', credenciales_file, 'DNI'), file_signature(credenciales_file),
+                           lambda: TableIndex(df_credenciales, 'DNI'))
+
+with profiler.stage('credentials_index'):
+    credenciales_index = load_credentials_index()
+
+# Weekly totals per patient/exercise/position, updated in place on every save
+def load_aggregates():
+    return table_cache.get(('aggregates', datos_file), storage.signature(datos_file),
+                           lambda: SessionAggregates(load_table(datos_file, df_datos.columns)))
+
+# Logotipo: st.image lee el fichero directamente, sin cargar PIL aquí
+logo_image = logo_file if os.path.exists(logo_file) else None
 
 # Autenticación de usuarios
 if 'authenticated' not in st.session_state:
     st.session_state['authenticated'] = False
 
+# Administradores: emails separados por comas en TECHEALTH_ADMINS
+admin_emails = {auth.normalize_user(email) for email in os.environ.get('TECHEALTH_ADMINS', '').split(',') if email.strip()}
+
+def is_admin():
+    return st.session_state['authenticated'] and st.session_state.get('user_email') in admin_emails
+
 def login():
     st.sidebar.header("Login")
     email = st.sidebar.text_input("Email")
@@ -95,9 +184,10 @@ def login():
     login_button = st.sidebar.button("Login", key="login_button")
 
     if login_button:
-        if check_login_credentials(email, password, df_login_credentials):
+        if check_login_credentials(email, password, login_store):
             st.sidebar.success("Login successful!")
             st.session_state['authenticated'] = True
+            st.session_state['user_email'] = auth.normalize_user(email)
         else:
             st.sidebar.error("Invalid email or password")
 
@@ -110,11 +200,33 @@ with st.sidebar:
         st.image(logo_image, use_column_width=True)
     selected = option_menu(
         menu_title=None,
-        options=["Home", "Data", "View Data", "Masters", "Analysis", "Video"],
-        icons=["house", "table", "eye", "person", "bar-chart", "camera"],
+        options=["Home", "Data", "View Data", "Progress", "Masters", "Analysis", "Video"],
+        icons=["house", "table", "eye", "graph-up", "person", "bar-chart", "camera"],
         menu_icon="cast",
         default_index=0,
     )
+    if st.session_state['authenticated']:
+        cache_stats = table_cache.stats()
+        st.caption(f"Caché: {cache_stats['hits']} aciertos / {cache_stats['misses']} fallos ({cache_stats['entries']} entradas)")
+        with st.expander("Tiempos de arranque"):
+            startup_report = startup.report()
+            if startup_report['reruns']:
+                st.write(f"Arranque en frío: {startup_report['cold_start_s']:.2f} s")
+                st.write(f"Última ejecución: {startup_report['last_rerun_s']:.3f} s")
+            if startup_report['mean_rerun_s'] is not None:
+                st.write(f"Media por ejecución: {startup_report['mean_rerun_s']:.3f} s ({startup_report['reruns'] - 1} ejecuciones)")
+            for module, seconds in startup_report['imports_s'].items():
+                st.write(f"import {module}: {seconds:.2f} s")
+    if is_admin():
+        with st.expander("Depuración"):
+            st.checkbox("Perfilado por ejecución", key="perfilado")
+            last_profile = st.session_state.get('last_profile')
+            if last_profile:
+                st.write("Última ejecución:")
+                st.dataframe(pd.DataFrame(last_profile, columns=['Página', 'Etapa', 'Segundos']))
+            st.write("Memoria de las tablas (carga original → tipos compactos):")
+            st.dataframe(schemas.memory_report(), hide_index=True)
+            st.download_button("Métricas (Prometheus)", profiling.registry.to_prometheus(), file_name="metrics.prom", mime="text/plain")
 
 # Define page functions
 def home_page():
@@ -133,6 +245,8 @@ def home_page():
                     """
                 )
             with right_column:
+                # Cargar la animación Lottie
+                lottie_coding = load_lottieurl(lottie_url)
                 if lottie_coding:
                     st_lottie(lottie_coding, height=300, key="coding")
                 else:
@@ -162,7 +276,13 @@ def data_page():
     st.title("Sesion")
     st.write("Introduce los datos del paciente y los ejercicios que realiza.")
     
-    df_datos_local = load_excel(datos_file, df_datos.columns)
+    # Values measured on the Video page pre-fill the form once
+    if 'prefill_sesion' in st.session_state:
+        st.session_state.update(st.session_state.pop('prefill_sesion'))
+        st.info("Repeticiones y tiempo rellenados a partir del análisis de vídeo.")
+    
+    # Outside the form so the exercise list follows the chosen position
+    posicion_corporal = st.selectbox("Posición del Cuerpo", ejercicios.positions, key="posicion_corporal")
     
     with st.form("exercise_form"):
         col1, col2, col3 = st.columns(3)
@@ -170,9 +290,8 @@ def data_page():
         with col1:
             nombre = st.text_input("Nombre del Paciente", key="nombre_paciente")
             dni = st.text_input("DNI del Paciente", key="dni_paciente")
-            posicion_corporal = st.selectbox("Posición del Cuerpo", df_ejercicios['POSICIÓN CORPORAL'].dropna().unique(), key="posicion_corporal")
         
-        nombre_ejercicio = st.selectbox("Nombre del ejercicio", df_ejercicios['NOMBRE EJERCICIO'].dropna().unique(), key="nombre_ejercicio")
+        nombre_ejercicio = st.selectbox("Nombre del ejercicio", ejercicios.exercises(posicion_corporal), key="nombre_ejercicio")
         
         with col2:
             repeticiones = st.number_input("Número de Repeticiones", min_value=0, step=1, key="repeticiones")
@@ -191,14 +310,29 @@ def data_page():
             'DNI': [dni],
             'Posición Corporal': [posicion_corporal],
             'Nombre Ejercicio': [nombre_ejercicio],
+            'ID Ejercicio': [ejercicios.exercise_id(nombre_ejercicio, posicion_corporal)],
             'Repeticiones': [repeticiones],
             'Tiempo (min)': [tiempo],
             'Kilos': [kilos]
         })
-        df_datos_local = pd.concat([df_datos_local, new_data], ignore_index=True)
-        save_to_excel(df_datos_local, datos_file)
+        save_sessions(new_data)
         st.success("Datos guardados correctamente.")
 
+    # Encoding the whole history is slow, so the workbook is only built on
+    # request, once per version of the table
+    if st.button("Preparar exportación", key="preparar_exportacion"):
+        with st.spinner("Generando el Excel..."):
+            st.session_state['exportacion'] = (storage.signature(datos_file),
+                                               storage.export_excel_bytes(datos_file, df_datos.columns))
+    exportacion = st.session_state.get('exportacion')
+    if exportacion is not None and exportacion[0] == storage.signature(datos_file):
+        st.download_button(
+            label="Exportar a Excel",
+            data=exportacion[1],
+            file_name=datos_file,
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
+
 def view_data_page():
     if not st.session_state['authenticated']:
         st.warning("Por favor, inicia sesión para acceder a esta página.")
@@ -209,16 +343,61 @@ def view_data_page():
     nombre_input = st.text_input("Nombre del Paciente", key="nombre_input")
     dni_input = st.text_input("DNI del Paciente", key="dni_input")
     if st.button("Ver Datos", key="ver_datos"):
-        if validate_credentials(nombre_input, dni_input, df_credenciales):
-            df_datos_local = load_excel(datos_file, df_datos.columns)
-            datos_filtrados = df_datos_local[(df_datos_local['Nombre'] == nombre_input) & (df_datos_local['DNI'] == dni_input)]
-            if not datos_filtrados.empty:
-                st.dataframe(datos_filtrados)
-            else:
-                st.error("No se encontraron datos de este paciente.")
+        if validate_credentials(nombre_input, dni_input, credenciales_index):
+            # Remembered so the history survives the reruns caused by the filters
+            st.session_state['paciente_consultado'] = (nombre_input, dni_input)
         else:
+            st.session_state.pop('paciente_consultado', None)
             st.error("Datos incorrectos. Inténtalo de nuevo.")
 
+    if st.session_state.get('paciente_consultado') != (nombre_input, dni_input):
+        return
+
+    # Filtros aplicados en el almacenamiento; solo se lee la página visible
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        fechas = st.date_input("Rango de fechas", value=(), key="filtro_fechas")
+    with col2:
+        posiciones = st.multiselect("Posición Corporal", ejercicios.positions, key="filtro_posiciones")
+    with col3:
+        nombres_ejercicio = st.multiselect("Ejercicio", ejercicios.exercises(posiciones), key="filtro_ejercicios")
+
+    fecha_desde = fechas[0].strftime("%Y-%m-%d") if len(fechas) > 0 else None
+    fecha_hasta = fechas[-1].strftime("%Y-%m-%d") if len(fechas) > 0 else None
+    total = paginated_table(
+        datos_file, df_datos.columns, key="historial",
+        equals={'DNI': dni_input, 'Nombre': nombre_input},
+        isin={'Posición Corporal': posiciones, 'Nombre Ejercicio': nombres_ejercicio},
+        between={'Fecha': (fecha_desde, fecha_hasta)},
+        sort_options=['Fecha', 'Nombre Ejercicio', 'Posición Corporal', 'Repeticiones', 'Tiempo (min)', 'Kilos'],
+    )
+    if total == 0:
+        st.error("No se encontraron datos de este paciente.")
+
+# Sort/page-size controls and one page of rows fetched from storage; returns the number of matches
+def paginated_table(file, columns, key, sort_options, equals=None, isin=None, between=None, page_sizes=(25, 50, 100)):
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        sort_by = st.selectbox("Ordenar por", sort_options, key=f"{key}_orden")
+    with col2:
+        descending = st.checkbox("Descendente", value=True, key=f"{key}_descendente")
+    with col3:
+        page_size = st.selectbox("Filas por página", page_sizes, key=f"{key}_filas")
+    with col4:
+        page = st.number_input("Página", min_value=1, step=1, key=f"{key}_pagina")
+
+    rows, total = storage.query_page(file, columns, equals=equals, isin=isin, between=between, sort_by=sort_by,
+                                     ascending=not descending, offset=(page - 1) * page_size, limit=page_size)
+    pages = max(1, -(-total // page_size))
+    if page > pages:
+        rows, _ = storage.query_page(file, columns, equals=equals, isin=isin, between=between, sort_by=sort_by,
+                                     ascending=not descending, offset=(pages - 1) * page_size, limit=page_size)
+        page = pages
+    if total:
+        st.dataframe(rows)
+        st.caption(f"Página {page} de {pages} · {total} registros")
+    return total
+
 def masters_page():
     if not st.session_state['authenticated']:
         st.warning("Por favor, inicia sesión para acceder a esta página.")
@@ -227,19 +406,16 @@ def masters_page():
     st.title("Gestión de Profesionales y Clientes")
     st.write("Registrar nuevos profesionales y clientes, y gestionar los existentes.")
     
-    tab1, tab2 = st.tabs(["Profesionales", "Clientes"])
+    tab1, tab2, tab3 = st.tabs(["Profesionales", "Clientes", "Importar"])
     
     with tab1:
         st.subheader("Registro de Profesionales")
         
-        # Reload df_profesionales to ensure it includes any newly added professionals
-        df_profesionales_local = load_excel(profesionales_file, df_profesionales.columns)
+        # Shared ID index, kept up to date with newly added professionals
+        profesionales_index = load_index(profesionales_file, 'ID', df_profesionales.columns)
         
-        # Generate a new unique ID for the professional
-        if not df_profesionales_local.empty:
-            new_id = df_profesionales_local['ID'].max() + 1
-        else:
-            new_id = 1
+        # Preview of the next ID; the definitive one is allocated on save
+        new_id = storage.peek_next_id(profesionales_file)
         
         with st.form("professional_form"):
             col1, col2 = st.columns(2)
@@ -270,9 +446,8 @@ def masters_page():
                 'Codigo Postal': [codigo_postal],
                 'Tipo': [tipo]
             })
-            df_profesionales_local = pd.concat([df_profesionales_local, new_professional], ignore_index=True)
-            save_to_excel(df_profesionales_local, profesionales_file)
-            st.success("Profesional registrado correctamente.")
+            new_professional = append_to_excel(new_professional, profesionales_file, id_column='ID')
+            st.success(f"Profesional registrado correctamente con ID {new_professional['ID'].iloc[0]}.")
         
         st.subheader("Consultar Información de Profesionales")
         professional_id_input = st.text_input("Introduce ID del Profesional", key="consulta_profesional_id")
@@ -281,23 +456,24 @@ def masters_page():
             if not professional_id_input:
                 st.error("Por favor, introduce un ID de Profesional.")
             else:
-                professional_info = df_profesionales_local[df_profesionales_local['ID'] == int(professional_id_input)]
+                professional_info = profesionales_index.lookup(professional_id_input)
                 if not professional_info.empty:
                     st.dataframe(professional_info)
                 else:
                     st.error("Profesional no encontrado.")
+
+        st.subheader("Listado de Profesionales")
+        paginated_table(profesionales_file, df_profesionales.columns, key="listado_profesionales",
+                        sort_options=['ID', 'Nombre', 'Apellidos', 'Tipo', 'Municipio'])
     
     with tab2:
         st.subheader("Registro de Clientes")
         
-        # Reload df_clientes to ensure it includes any newly added clients
-        df_clientes_local = load_excel(clientes_file, df_clientes.columns)
+        # Shared ID index, kept up to date with newly added clients
+        clientes_index = load_index(clientes_file, 'ID', df_clientes.columns)
         
-        # Generate a new unique ID for the client
-        if not df_clientes_local.empty:
-            new_id = df_clientes_local['ID'].max() + 1
-        else:
-            new_id = 1
+        # Preview of the next ID; the definitive one is allocated on save
+        new_id = storage.peek_next_id(clientes_file)
         
         with st.form("client_form"):
             col1, col2 = st.columns(2)
@@ -326,9 +502,8 @@ def masters_page():
                 'Municipio': [municipio],
                 'Codigo Postal': [codigo_postal]
             })
-            df_clientes_local = pd.concat([df_clientes_local, new_client], ignore_index=True)
-            save_to_excel(df_clientes_local, clientes_file)
-            st.success("Cliente registrado correctamente.")
+            new_client = append_to_excel(new_client, clientes_file, id_column='ID')
+            st.success(f"Cliente registrado correctamente con ID {new_client['ID'].iloc[0]}.")
         
         st.subheader("Consultar Información de Clientes")
         client_id_input = st.text_input("Introduce ID del Cliente", key="consulta_cliente_id")
@@ -337,12 +512,71 @@ def masters_page():
             if not client_id_input:
                 st.error("Por favor, introduce un ID de Cliente.")
             else:
-                client_info = df_clientes_local[df_clientes_local['ID'] == int(client_id_input)]
+                client_info = clientes_index.lookup(client_id_input)
                 if not client_info.empty:
                     st.dataframe(client_info)
                 else:
                     st.error("Cliente no encontrado.")
 
+        st.subheader("Listado de Clientes")
+        paginated_table(clientes_file, df_clientes.columns, key="listado_clientes",
+                        sort_options=['ID', 'Nombre', 'Apellidos', 'Municipio'])
+
+    with tab3:
+        bulk_import_section()
+
+# Bulk import: the whole batch is validated at once and, if it is clean,
+# appended in a single write
+def bulk_import_section():
+    bulk_import = lazy_import('bulk_import')
+    st.subheader("Importación Masiva")
+    st.write("Sube un CSV o Excel con sesiones, profesionales o clientes. Se valida el lote completo antes de guardar nada.")
+    targets = {
+        'sesiones': (datos_file, df_datos, None),
+        'profesionales': (profesionales_file, df_profesionales, 'ID'),
+        'clientes': (clientes_file, df_clientes, 'ID'),
+    }
+    kind = st.selectbox("Tipo de datos", list(targets), format_func=str.capitalize, key="import_tipo")
+    file, existing, id_column = targets[kind]
+    st.caption("Columnas: " + ", ".join(bulk_import.SCHEMAS[kind]['columns'])
+               + (". Sin columna ID se asignan IDs nuevos." if id_column else ""))
+    uploaded_file = st.file_uploader("Archivo", type=['csv', 'xlsx'], key=f"import_archivo_{kind}")
+    if uploaded_file is None:
+        return
+    # A batch is imported once per session: sessions have no key to detect
+    # repeats, so a second click would store the whole batch again
+    batch = (kind, lazy_import('ingest').content_hash(uploaded_file))
+    importados = st.session_state.setdefault('lotes_importados', set())
+    if batch in importados:
+        st.info("Este archivo ya se ha importado.")
+        return
+
+    rows, errors = bulk_import.validate_batch(bulk_import.read_batch(uploaded_file), kind,
+                                              catalogue=ejercicios.frame, existing=existing)
+    if not errors.empty:
+        st.error(f"{errors['Fila'].nunique()} filas con errores; corrígelas y vuelve a subir el archivo.")
+        st.dataframe(errors, hide_index=True)
+        return
+    if rows.empty:
+        st.warning("El archivo no contiene filas.")
+        return
+
+    if kind == 'sesiones':
+        rows['ID Ejercicio'] = ejercicios.ids_for(rows)
+    st.dataframe(rows.head(100), hide_index=True)
+    if st.button(f"Importar {len(rows)} filas", key="import_confirmar"):
+        try:
+            if kind == 'sesiones':
+                save_sessions(rows)
+            else:
+                append_to_excel(rows, file, id_column=id_column, keep_ids=id_column in rows)
+        except ValueError as e:
+            # Another session took some of the IDs since validation
+            st.error(f"No se ha importado nada: {e}")
+        else:
+            importados.add(batch)
+            st.success(f"{len(rows)} filas importadas correctamente.")
+
 def analysis_page():
     if not st.session_state['authenticated']:
         st.warning("Por favor, inicia sesión para acceder a esta página.")
@@ -351,15 +585,120 @@ def analysis_page():
     st.title("Análisis de Datos de Pacientes")
     st.write("Explora y analiza los datos de ejercicios de los pacientes.")
     
-    df_datos_local = load_excel(datos_file, df_datos.columns)
+    # Only weekly totals are sent to the browser by default; raw rows are opt-in and sampled
+    vista = st.radio("Datos", ["Totales semanales", "Muestra de sesiones"], horizontal=True, key="vista_analisis")
+    if vista == "Totales semanales":
+        df_analisis = load_aggregates().to_frame()
+    else:
+        df_datos_local = load_table(datos_file, df_datos.columns)
+        max_filas = st.number_input("Número máximo de filas", min_value=100, max_value=100000, value=5000, step=100, key="filas_muestra")
+        if len(df_datos_local) > max_filas:
+            st.info(f"Mostrando una muestra aleatoria de {max_filas} de {len(df_datos_local)} sesiones.")
+            df_analisis = df_datos_local.sample(n=int(max_filas), random_state=0)
+        else:
+            df_analisis = df_datos_local
     
-    if not df_datos_local.empty:
+    if not df_analisis.empty:
         # Utiliza Pygwalker para mostrar el análisis
-        pygwalker_html = pyg.walk(df_datos_local)
-        st.components.v1.html(pygwalker_html.to_html(), height=800, scrolling=True)
+        with profiler.stage('pygwalker_html'):
+            pygwalker_html = cached_report(vista, df_analisis)
+        if pygwalker_html is not None:
+            st.components.v1.html(pygwalker_html, height=800, scrolling=True)
     else:
         st.warning("No hay datos disponibles para su análisis.")
 
+# Serves the pre-rendered report at once; when the data changed, the previous
+# one is shown while the new one renders in the background
+def cached_report(name, df):
+    html, fresh, future = get_report_cache().lookup(name, df)
+    if html is None:
+        with st.spinner("Generando el informe por primera vez..."):
+            try:
+                future.result()
+            except Exception as e:
+                st.error(f"No se ha podido generar el informe: {e}")
+                return None
+        html, fresh, future = get_report_cache().lookup(name, df)
+    elif not fresh:
+        st.info("Informe desactualizado: se está actualizando en segundo plano. Recarga la página en unos segundos.")
+    return html
+
+# Starts rendering the weekly-totals report right after sessions are saved,
+# so the next visit to Analysis finds it ready. Only uses totals that are
+# already cached (and kept current by apply_write); never builds them here.
+def prerender_analysis():
+    aggregates = table_cache.peek(('aggregates', datos_file), storage.signature(datos_file))
+    if aggregates is not None:
+        get_report_cache().refresh("Totales semanales", aggregates.to_frame())
+
+# Every write to the session log goes through here, so the progress summary
+# and the analysis report follow it
+def save_sessions(rows):
+    # Before the append: a first-time build must not already include these rows
+    store = get_progress_store()
+    rows = append_to_excel(rows, datos_file)
+    store.add_rows(rows)
+    prerender_analysis()
+    return rows
+
+def progress_page():
+    if not st.session_state['authenticated']:
+        st.warning("Por favor, inicia sesión para acceder a esta página.")
+        return
+
+    st.title("Progreso del Paciente")
+    st.write("Evolución semanal de repeticiones, tiempo y kilos por ejercicio.")
+    progress = lazy_import('progress')
+    store = get_progress_store()
+
+    # The summary counts the sessions it has folded in; a different count
+    # means the log was changed outside the app
+    if store.rows() != len(df_datos):
+        st.warning("El resumen no coincide con el registro de sesiones.")
+    if st.button("Reconstruir resumen", key="progreso_reconstruir"):
+        with st.spinner("Reconstruyendo el resumen de progreso..."):
+            store.rebuild(load_table(datos_file, df_datos.columns))
+        st.success("Resumen reconstruido.")
+
+    nombre_defecto, dni_defecto = st.session_state.get('paciente_consultado', ('', ''))
+    nombre_input = st.text_input("Nombre del Paciente", value=nombre_defecto, key="progreso_nombre")
+    dni_input = st.text_input("DNI del Paciente", value=dni_defecto, key="progreso_dni")
+    if st.button("Ver Progreso", key="ver_progreso"):
+        if validate_credentials(nombre_input, dni_input, credenciales_index):
+            st.session_state['paciente_consultado'] = (nombre_input, dni_input)
+        else:
+            st.session_state.pop('paciente_consultado', None)
+            st.error("Datos incorrectos. Inténtalo de nuevo.")
+
+    if st.session_state.get('paciente_consultado') != (nombre_input, dni_input):
+        return
+
+    semanal = store.patient(dni_input)
+    if semanal.empty:
+        st.info("Este paciente todavía no tiene sesiones registradas.")
+        return
+
+    mes = progress.month_totals(semanal, datetime.now())
+    st.caption("Totales de las semanas que empiezan este mes.")
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Kilos (semanas del mes)", f"{mes['Kilos']:.1f}")
+    col2.metric("Repeticiones (semanas del mes)", int(mes['Repeticiones']))
+    col3.metric("Minutos (semanas del mes)", int(mes['Tiempo (min)']))
+    col4.metric("Sesiones (semanas del mes)", int(mes['Sesiones']))
+
+    medida = st.selectbox("Medida", progress.VALUE_COLUMNS, key="progreso_medida")
+    ejercicios_paciente = semanal['Nombre Ejercicio'].unique().tolist()
+    seleccion = st.multiselect("Ejercicios", ejercicios_paciente, default=ejercicios_paciente[:5], key="progreso_ejercicios")
+
+    st.subheader(f"{medida} por semana")
+    st.bar_chart(semanal.groupby('Semana')[medida].sum())
+    if seleccion:
+        st.subheader(f"Tendencia de {medida.lower()} por ejercicio")
+        tendencia = (semanal[semanal['Nombre Ejercicio'].isin(seleccion)]
+                     .pivot_table(index='Semana', columns='Nombre Ejercicio', values=medida, aggfunc='sum'))
+        st.line_chart(tendencia)
+    st.dataframe(semanal.sort_values('Semana', ascending=False), hide_index=True)
+
 def video_page():
     if not st.session_state['authenticated']:
         st.warning("Por favor, inicia sesión para acceder a esta página.")
@@ -368,53 +707,251 @@ def video_page():
     st.title("Video")
     st.write("En esta página analizamos tus movimientos")
     
+    modo = st.radio("Modo", ["Cámara en directo", "Vídeo grabado", "Grabaciones", "Estaciones"], horizontal=True, key="modo_video")
+    PosePipeline = lazy_import('pose_pipeline').PosePipeline
+    LandmarkBuffer = lazy_import('pose_metrics').LandmarkBuffer
+    if modo == "Vídeo grabado":
+        stop_pose_pipeline()
+        recorded_video_section()
+        return
+    if modo == "Grabaciones":
+        stop_pose_pipeline()
+        recordings_section()
+        return
+    if modo == "Estaciones":
+        stop_pose_pipeline()
+        stations_section()
+        return
+
+    target_fps = st.sidebar.slider("FPS objetivo", min_value=1, max_value=30, value=15, key="fps_objetivo")
+    # Modo rendimiento: menor resolución de inferencia y detección cada N frames
+    performance_mode = st.sidebar.checkbox("Modo rendimiento", key="modo_rendimiento")
+    inference_width, max_skip = None, 1
+    if performance_mode:
+        inference_width = st.sidebar.selectbox("Resolución de inferencia (ancho)", [320, 480, 640], index=1, key="ancho_inferencia")
+        max_skip = st.sidebar.slider("Detectar como máximo cada N frames", min_value=1, max_value=10, value=4, key="max_salto")
+    # A checkbox rather than a button so the camera stays closed across reruns
+    close_camera = not st.sidebar.checkbox("Cámara activa", value=True, key="camara_activa")
+    # Raw frames go to a video file and landmarks to a sidecar, both written off the display loop
+    record_session = st.sidebar.checkbox("Grabar sesión", key="grabar_sesion")
+    dni_grabacion = st.sidebar.text_input("DNI del Paciente", key="dni_grabacion") if record_session else ""
+
+    # Any widget interaction reruns the page, so stop the previous pipeline first
+    stop_pose_pipeline()
+    if close_camera:
+        st.write("Cámara cerrada.")
+        landmark_buffer = st.session_state.get('pose_buffer')
+        if landmark_buffer is not None and len(landmark_buffer):
+            show_pose_metrics(landmark_buffer.window(), target_fps, key="metricas_directo")
+        return
+
     st.write("Activando la cámara...")
-    cap = cv2.VideoCapture(0)
-    
-    if not cap.isOpened():
+    landmark_buffer = LandmarkBuffer(capacity=target_fps * 60 * 10)
+    st.session_state['pose_buffer'] = landmark_buffer
+    recorder = None
+    if record_session:
+        if dni_grabacion:
+            recording = lazy_import('recording')
+            recorder = recording.SessionRecorder(recording.new_recording(dni_grabacion), fps=target_fps)
+            st.info("Grabando la sesión. Desmarca «Cámara activa» para terminar.")
+        else:
+            st.warning("Introduce el DNI del paciente para grabar la sesión.")
+    pipeline = PosePipeline(0, target_fps=target_fps, landmark_buffer=landmark_buffer,
+                            inference_width=inference_width, max_skip=max_skip, recorder=recorder)
+    if not pipeline.start():
         st.error("No se pudo abrir la cámara.")
         return
+    st.session_state['pose_pipeline'] = pipeline
     
     stframe = st.empty()
-    close_camera = st.sidebar.button("Cerrar Cámara", key="cerrar_camara")
+    stats_text = st.empty()
 
-    pose = mp.solutions.pose.Pose(
-        min_tracking_confidence=0.5,
-        min_detection_confidence=0.5)
-    
+    # Capture, inference and drawing run on background threads; this loop only displays
     while True:
-        ret, frame = cap.read()
-        if not ret:
-            st.error("Error al capturar el frame de la cámara")
-            break
-        
-        # Convertir la imagen a RGB
-        image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = pose.process(image)
-        
-        mp.solutions.drawing_utils.draw_landmarks(
-            image,
-            results.pose_landmarks,
-            mp.solutions.pose.POSE_CONNECTIONS,
-            mp.solutions.drawing_utils.DrawingSpec(color=(0, 0, 255), thickness=2, circle_radius=2),
-            mp.solutions.drawing_utils.DrawingSpec(color=(0, 255, 0), thickness=2, circle_radius=2))
-        
+        item = pipeline.get_frame(timeout=1.0)
+        if item is None:
+            if not pipeline.running:
+                break
+            continue
+        frame_no, image = item
         stframe.image(image, channels="RGB", use_column_width=True)
-        
-        if close_camera:
-            cap.release()
+        stats = pipeline.stats()
+        if profiler.enabled:
+            profiling.registry.set_gauge('techealth_pose_inference_ms', stats['inference_ms'])
+            profiling.registry.set_gauge('techealth_pose_fps', stats['fps'])
+        stats_text.caption(
+            f"{stats['fps']:.1f} FPS · latencia {stats['latency_ms']:.0f} ms · frames descartados: {stats['dropped']} · "
+            f"inferencia {stats['inference_ms']:.0f} ms a {inference_width or 'resolución completa'} px, cada {stats['detect_every']} frames")
+
+    if pipeline.error:
+        st.error(pipeline.error)
+    stop_pose_pipeline()
+
+# Offline pose analysis of a recorded session, spread over a process pool
+def recorded_video_section():
+    batch_pose = lazy_import('batch_pose')
+    dni = st.text_input("DNI del Paciente", key="dni_video")
+    uploaded_video = st.file_uploader("Vídeo de la sesión", type=["mp4", "avi", "mov", "mkv"], key="video_sesion")
+    workers = st.number_input("Procesos", min_value=1, max_value=os.cpu_count() or 1, value=os.cpu_count() or 1, step=1, key="procesos_video")
+
+    if st.button("Analizar vídeo", key="analizar_video"):
+        if not dni or uploaded_video is None:
+            st.error("Por favor, introduce el DNI y selecciona un vídeo.")
+            return
+        # OpenCV needs a real file path, so the upload is spooled to disk first
+        suffix = os.path.splitext(uploaded_video.name)[1]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            video_path = os.path.join(tmp_dir, os.path.splitext(uploaded_video.name)[0] + suffix)
+            with open(video_path, 'wb') as f:
+                f.write(uploaded_video.getbuffer())
+            progress_bar = st.progress(0.0)
+            try:
+                output = batch_pose.analyze_video(video_path, dni, workers=int(workers), progress=progress_bar.progress)
+            except ValueError as e:
+                st.error(str(e))
+                return
+        st.success(f"Landmarks guardados en {output}.")
+
+    if dni:
+        sessions = batch_pose.list_landmarks(dni)
+        if sessions:
+            st.subheader("Sesiones analizadas")
+            for path in sessions:
+                landmarks, fps = batch_pose.load_landmarks(path)
+                with st.expander(f"{os.path.basename(path)}: {len(landmarks)} frames a {fps:.0f} FPS"):
+                    show_pose_metrics(landmarks, fps, key=f"metricas_{os.path.basename(path)}")
+
+# Several cameras (or video files standing in for them) processed by the
+# shared capture service; admins configure the stations, everyone can watch
+def stations_section():
+    workers = int(os.environ.get('TECHEALTH_POSE_WORKERS', 2))
+    service = get_capture_service(workers)
+    if is_admin():
+        with st.expander("Configurar estaciones"):
+            fuentes = st.text_area("Fuentes (una por línea: índice de cámara o ruta de vídeo)", key="estaciones_fuentes")
+            fps_estaciones = st.slider("FPS por estación", min_value=1, max_value=30, value=10, key="estaciones_fps")
+            col1, col2 = st.columns(2)
+            if col1.button("Aplicar", key="estaciones_aplicar"):
+                for name in list(service.stations):
+                    service.remove_station(name)
+                for number, source in enumerate(line for line in fuentes.splitlines() if line.strip()):
+                    station = service.add_station(f"Estación {number + 1}", source, target_fps=fps_estaciones)
+                    if station.error:
+                        st.error(station.error)
+            if col2.button("Detener todas", key="estaciones_detener"):
+                for name in list(service.stations):
+                    service.remove_station(name)
+
+    stats = service.stats()
+    if not stats:
+        st.info("No hay estaciones activas.")
+        return
+    st.caption(f"{workers} modelos de pose compartidos entre {len(stats)} estaciones")
+    st.dataframe(pd.DataFrame(stats).T[['source', 'fps', 'queue_depth', 'processed', 'dropped', 'latency_ms']]
+                 .rename(columns={'source': 'Fuente', 'fps': 'FPS', 'queue_depth': 'Cola', 'processed': 'Procesados',
+                                  'dropped': 'Descartados', 'latency_ms': 'Latencia (ms)'}))
+    estacion = st.selectbox("Estación", list(stats), key="estacion_elegida")
+    stframe = st.empty()
+    stats_text = st.empty()
+
+    # The service keeps running across reruns; this loop only shows the chosen station
+    sequence = 0
+    while True:
+        item = service.wait_frame(estacion, after=sequence, timeout=1.0)
+        station_stats = service.stats().get(estacion)
+        if station_stats is None:
             break
+        if item is None:
+            if not station_stats['running']:
+                break
+            continue
+        sequence, frame_no, image, landmarks = item
+        stframe.image(image, channels="RGB", use_column_width=True)
+        if profiler.enabled:
+            service.publish(profiling.registry)
+        stats_text.caption(f"{station_stats['fps']:.1f} FPS · cola {station_stats['queue_depth']} · "
+                           f"descartados {station_stats['dropped']} · latencia {station_stats['latency_ms']:.0f} ms")
+    if station_stats and station_stats['error']:
+        st.error(station_stats['error'])
+
+# Recorded sessions, played back frame by frame with the landmarks stored at
+# recording time (no pose estimation is run again)
+def recordings_section():
+    recording = lazy_import('recording')
+    dni = st.text_input("DNI del Paciente", key="dni_grabaciones")
+    if not dni:
+        return
+    recordings = recording.list_recordings(dni)
+    if not recordings:
+        st.info("No hay grabaciones de este paciente.")
+        return
+    video_path, sidecar_path = st.selectbox("Grabación", recordings, format_func=lambda paths: os.path.basename(paths[0]),
+                                            key="grabacion_elegida")
+    try:
+        player = recording.RecordingPlayer(video_path, sidecar_path)
+    except ValueError as e:
+        st.error(str(e))
+        return
+    if len(player) == 0:
+        st.warning("La grabación está vacía.")
+        player.close()
+        return
+    # Measured rate and capture times: frames dropped while recording leave gaps
+    fps = player.sidecar.fps
+    timestamps = player.sidecar.timestamps()
+    st.caption(f"{len(player)} frames a {fps:.1f} FPS ({player.sidecar.duration:.0f} s)")
+    frame_index = st.slider("Frame", min_value=0, max_value=len(player) - 1, value=0, key="grabacion_frame")
+    overlay = st.checkbox("Mostrar landmarks", value=True, key="grabacion_landmarks")
+    image = player.frame(frame_index, overlay=overlay)
+    if image is not None:
+        st.image(image, channels="RGB", caption=f"{timestamps[frame_index]:.1f} s", use_column_width=True)
+    with st.expander("Métricas de la grabación"):
+        show_pose_metrics(player.sidecar.landmarks(), fps, key=f"metricas_{os.path.basename(sidecar_path)}")
+    player.close()
+
+# Joint angle metrics for a window of landmarks, with an option to send the
+# measured repetitions and time to the session form
+def show_pose_metrics(landmarks, fps, key):
+    metrics = lazy_import('pose_metrics').summarize(landmarks, fps)
+    st.dataframe(pd.DataFrame(metrics['joints']).T.rename(columns={'rom': 'Rango de movimiento (°)', 'repeticiones': 'Repeticiones'}))
+    st.write(f"Articulación principal: {metrics['articulacion_principal']} · {metrics['repeticiones']} repeticiones · {metrics['tiempo_min']} min")
+    if st.button("Usar en el formulario de sesión", key=key):
+        st.session_state['prefill_sesion'] = {'repeticiones': metrics['repeticiones'], 'tiempo': metrics['tiempo_min']}
+        st.success("Valores enviados a la página Data.")
+
+# Stop the pose pipeline left running by an earlier rerun of this session
+def stop_pose_pipeline():
+    pipeline = st.session_state.get('pose_pipeline')
+    if pipeline is not None:
+        pipeline.stop()
+        st.session_state['pose_pipeline'] = None
+
+# Everything above runs on every rerun; page rendering is not included
+startup.record_run(time.perf_counter() - script_started)
 
 # Display the corresponding page based on menu selection
-if selected == "Home":
-    home_page()
-elif selected == "Data":
-    data_page()
-elif selected == "View Data":
-    view_data_page()
-elif selected == "Masters":
-    masters_page()
-elif selected == "Analysis":
-    analysis_page()
-elif selected == "Video":
-    video_page()
+if selected != "Video":
+    stop_pose_pipeline()
+
+profiler.page = selected
+with profiler.stage('render'):
+    if selected == "Home":
+        home_page()
+    elif selected == "Data":
+        data_page()
+    elif selected == "View Data":
+        view_data_page()
+    elif selected == "Progress":
+        progress_page()
+    elif selected == "Masters":
+        masters_page()
+    elif selected == "Analysis":
+        analysis_page()
+    elif selected == "Video":
+        video_page()
+
+if profiler.enabled:
+    profiler.record('script', time.perf_counter() - script_started)
+    profiling.record_dataframe_memory(table_cache)
+    profiling.registry.write()
+    st.session_state['last_profile'] = profiler.stages
@@ -0,0 +1,123 @@
+import hashlib
+import hmac
+import os
+import secrets
+import sys
+import threading
+import time
+
+import pandas as pd
+
+import storage
+from cache import file_signature
+
+ALGORITHM = 'pbkdf2_sha256'
+# PBKDF2 iterations for new hashes; existing hashes keep the count they were made with
+HASH_ITERATIONS = int(os.environ.get('TECHEALTH_HASH_ITERATIONS', 200000))
+
+
+def hash_password(password, iterations=None, salt=None):
+    iterations = iterations or HASH_ITERATIONS
+    salt = salt or secrets.token_hex(16)
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), iterations)
+    return f'{ALGORITHM}${iterations}${salt}${digest.hex()}'
+
+
+def is_hashed(value):
+    return isinstance(value, str) and value.startswith(ALGORITHM + '$')
+
+
+# Constant-time check of a password against a stored hash. Workbooks that
+# have not been migrated yet still hold plaintext, compared in constant time too.
+def check_password(password, stored):
+    if not is_hashed(stored):
+        return hmac.compare_digest(str(password).encode(), str(stored).encode())
+    _, iterations, salt, expected = stored.split('$')
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), int(iterations))
+    return hmac.compare_digest(digest.hex(), expected)
+
+
+def normalize_user(user):
+    return str(user).strip().lower()
+
+
+# Credentials of one workbook as a dict user -> stored hash
+class CredentialStore:
+    def __init__(self, df, user_column, password_column):
+        df = df.dropna(subset=[user_column, password_column])
+        self.passwords = dict(zip(df[user_column].map(normalize_user), df[password_column].astype(str)))
+        # Unknown users are checked against this so they take as long as known ones
+        self.dummy_hash = hash_password(secrets.token_hex(8))
+
+    def __len__(self):
+        return len(self.passwords)
+
+    # Every login runs one PBKDF2: unknown users and plaintext entries (of
+    # workbooks not migrated yet) against the dummy hash, so neither can be
+    # told apart from a known, hashed account by timing
+    def verify(self, user, password):
+        stored = self.passwords.get(normalize_user(user))
+        if stored is None or not is_hashed(stored):
+            check_password(password, self.dummy_hash)
+            return stored is not None and check_password(password, stored)
+        return check_password(password, stored)
+
+
+stores = {}
+stores_lock = threading.Lock()
+
+
+# Process-wide store for a credentials workbook, reloaded only when the
+# file changes. Loaded under the lock so concurrent sessions load it once.
+def get_store(file, user_column, password_column):
+    signature = file_signature(file)
+    key = (file, user_column, password_column)
+    with stores_lock:
+        entry = stores.get(key)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+        df = pd.read_excel(file) if os.path.exists(file) else pd.DataFrame(columns=[user_column, password_column])
+        store = CredentialStore(df, user_column, password_column)
+        stores[key] = (signature, store)
+    return store
+
+
+# Replaces plaintext passwords in a credentials workbook with salted hashes
+def hash_credentials_file(file, password_column, iterations=None):
+    with storage.file_lock(file):
+        df = pd.read_excel(file)
+        df[password_column] = [value if is_hashed(value) or pd.isna(value) else hash_password(str(value), iterations)
+                               for value in df[password_column]]
+        storage.atomic_to_excel(df, file)
+
+
+# Load time and logins per second against a synthetic store of `users`
+# accounts, hashed (they all share one hash, which does not change the
+# per-login cost) and in plaintext, as in a workbook not migrated yet
+def benchmark(users=5000, logins=200, iterations=None):
+    emails = [f'user{i}@example.com' for i in range(users)]
+    results = {'users': users}
+    for case, password in (('hashed', hash_password('password', iterations)), ('plaintext', 'password')):
+        df = pd.DataFrame({'email': emails, 'password': password})
+        started = time.perf_counter()
+        store = CredentialStore(df, 'email', 'password')
+        results[f'{case}_load_s'] = time.perf_counter() - started
+        started = time.perf_counter()
+        for i in range(logins):
+            assert store.verify(emails[i % users], 'password')
+        elapsed = time.perf_counter() - started
+        results[f'{case}_logins_per_s'] = logins / elapsed
+        results[f'{case}_ms_per_login'] = 1000 * elapsed / logins
+    return results
+
+
+if __name__ == '__main__':
+    # python auth.py hash credentials.xlsx password
+    # python auth.py bench [users] [logins]
+    command = sys.argv[1]
+    if command == 'hash':
+        hash_credentials_file(sys.argv[2], sys.argv[3])
+    elif command == 'bench':
+        print(benchmark(*(int(arg) for arg in sys.argv[2:4])))
+    else:
+        sys.exit(f"Unknown command '{command}'")
@@ -0,0 +1,106 @@
+import argparse
+import glob
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import mediapipe as mp
+import numpy as np
+
+from indexes import normalize_key
+from pose_pipeline import LANDMARK_FIELDS, NUM_LANDMARKS, landmarks_to_array
+
+LANDMARKS_DIR = 'landmarks'
+
+# One Pose model per worker process, created by the pool initializer
+pose = None
+
+
+def init_worker():
+    global pose
+    pose = mp.solutions.pose.Pose(min_tracking_confidence=0.5, min_detection_confidence=0.5)
+
+
+def video_info(path):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError(f"No se pudo abrir el vídeo '{path}'.")
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+    cap.release()
+    return total, fps
+
+
+# Runs in a worker: landmarks for frames [start, stop) as a (n, 33, 4) array
+def process_chunk(path, start, stop):
+    # A worker gets chunks from anywhere in the video, so drop tracking state
+    pose.reset()
+    cap = cv2.VideoCapture(path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    landmarks = np.full((stop - start, NUM_LANDMARKS, LANDMARK_FIELDS), np.nan, dtype=np.float32)
+    count = 0
+    try:
+        while count < stop - start:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            results = pose.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            landmarks_to_array(results.pose_landmarks, landmarks[count])
+            count += 1
+    finally:
+        cap.release()
+    return start, landmarks[:count]
+
+
+# Splits the video into chunks of frames, runs them across a process pool and
+# saves the landmarks for the patient. `progress` is called with 0..1.
+def analyze_video(path, dni, workers=None, chunk_size=300, progress=None, output_dir=LANDMARKS_DIR):
+    total, fps = video_info(path)
+    landmarks = np.full((total, NUM_LANDMARKS, LANDMARK_FIELDS), np.nan, dtype=np.float32)
+    frames_read = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+        futures = [executor.submit(process_chunk, path, start, min(start + chunk_size, total))
+                   for start in range(0, total, chunk_size)]
+        for done, future in enumerate(as_completed(futures), 1):
+            start, chunk = future.result()
+            landmarks[start:start + len(chunk)] = chunk
+            frames_read = max(frames_read, start + len(chunk))
+            if progress:
+                progress(done / len(futures))
+    # The container's frame count is only an estimate for some codecs
+    return save_landmarks(dni, path, landmarks[:frames_read], fps, output_dir)
+
+
+def patient_dir(dni, output_dir=LANDMARKS_DIR):
+    return os.path.join(output_dir, re.sub(r'[^A-Z0-9]', '_', normalize_key(dni) or ''))
+
+
+def save_landmarks(dni, source, landmarks, fps, output_dir=LANDMARKS_DIR):
+    directory = patient_dir(dni, output_dir)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, os.path.splitext(os.path.basename(source))[0] + '.npz')
+    np.savez_compressed(path, landmarks=landmarks, fps=np.float32(fps), dni=str(dni), source=os.path.basename(source))
+    return path
+
+
+# Returns (landmarks, fps) from a file written by save_landmarks
+def load_landmarks(path):
+    with np.load(path) as data:
+        return data['landmarks'], float(data['fps'])
+
+
+def list_landmarks(dni, output_dir=LANDMARKS_DIR):
+    return sorted(glob.glob(os.path.join(patient_dir(dni, output_dir), '*.npz')))
+
+
+if __name__ == '__main__':
+    # python batch_pose.py 12345678A session1.mp4 session2.mp4 --workers 8
+    parser = argparse.ArgumentParser(description="Análisis de pose por lotes de vídeos grabados")
+    parser.add_argument('dni')
+    parser.add_argument('videos', nargs='+')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=300)
+    args = parser.parse_args()
+    for video in args.videos:
+        print(analyze_video(video, args.dni, workers=args.workers, chunk_size=args.chunk_size))
@@ -0,0 +1,172 @@
+import argparse
+import glob
+import json
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import storage
+from aggregates import SessionAggregates
+from indexes import TableIndex
+from startup import lazy_import
+
+RESULTS_DIR = 'bench_results'
+SESSION_COLUMNS = ['Fecha', 'Nombre', 'DNI', 'Posición Corporal', 'Nombre Ejercicio', 'Repeticiones', 'Tiempo (min)', 'Kilos']
+DNI_LETTERS = 'TRWAGMYFPDXBNJZSQVHLCKE'
+
+
+def make_dnis(rng, count):
+    numbers = rng.choice(10 ** 8, size=count, replace=False)
+    return [f'{n:08d}{DNI_LETTERS[n % 23]}' for n in numbers]
+
+
+def load_catalogue(file='ejercicios_pacientes.xlsx'):
+    if os.path.exists(file):
+        return pd.read_excel(file).dropna()
+    return pd.DataFrame({'POSICIÓN CORPORAL': ['SEDESTACIÓN'] * 20,
+                         'NOMBRE EJERCICIO': [f'Ejercicio {i}' for i in range(20)]})
+
+
+# Synthetic session log: `rows` sessions spread over `patients` patients and
+# about three years, drawn from the real exercise catalogue. Same seed, same data.
+def make_sessions(rows, patients=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    dnis = np.array(make_dnis(rng, patients))
+    names = np.array([f'Paciente {i}' for i in range(patients)])
+    catalogue = load_catalogue()
+    patient = rng.integers(0, patients, rows)
+    exercise = rng.integers(0, len(catalogue), rows)
+    dates = pd.Timestamp('2022-01-01') + pd.to_timedelta(np.sort(rng.integers(0, 3 * 365, rows)), unit='D')
+    return pd.DataFrame({
+        'Fecha': dates.strftime('%Y-%m-%d'),
+        'Nombre': names[patient],
+        'DNI': dnis[patient],
+        'Posición Corporal': catalogue['POSICIÓN CORPORAL'].to_numpy()[exercise],
+        'Nombre Ejercicio': catalogue['NOMBRE EJERCICIO'].to_numpy()[exercise],
+        'Repeticiones': rng.integers(0, 30, rows),
+        'Tiempo (min)': rng.integers(0, 60, rows),
+        'Kilos': rng.integers(0, 40, rows) / 2,
+    })
+
+
+def make_clients(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'ID': np.arange(1, rows + 1),
+        'Nombre': [f'Cliente {i}' for i in range(rows)],
+        'Apellidos': 'Apellido',
+        'Direccion': 'Calle Mayor 1',
+        'DNI': make_dnis(rng, rows),
+        'Telefono': rng.integers(600000000, 700000000, rows),
+        'Municipio': 'Rianxo',
+        'Codigo Postal': 15920,
+    })
+
+
+# Median wall time over `repeat` runs plus the peak traced allocation of one run
+def measure(func, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds': statistics.median(times), 'peak_mb': peak / 1e6}
+
+
+def run_size(rows, backend_name, repeat, workdir):
+    sessions = make_sessions(rows)
+    datos_file = os.path.join(workdir, f'datos_pacientes_{rows}.xlsx')
+    clientes_file = os.path.join(workdir, f'clientes_{rows}.xlsx')
+    backend = storage.ExcelBackend() if backend_name == 'excel' else storage.SQLiteBackend(os.path.join(workdir, f'bench_{rows}.db'))
+    backend.save(sessions, datos_file)
+    backend.save(make_clients(max(rows // 100, 100)), clientes_file)
+
+    new_row = make_sessions(1, seed=rows).iloc[:1]
+    new_client = make_clients(1, seed=rows).drop(columns='ID')
+    table = backend.load(datos_file, SESSION_COLUMNS)
+    dni, nombre = table[['DNI', 'Nombre']].iloc[len(table) // 2]
+    index = TableIndex(table, 'DNI')
+    aggregates = SessionAggregates(table)
+
+    cases = {
+        'load_excel': lambda: backend.load(datos_file, SESSION_COLUMNS),
+        'save_to_excel': lambda: backend.save(table, datos_file),
+        'data_page_append': lambda: backend.append(new_row, datos_file),
+        'view_data_scan': lambda: table[(table['DNI'] == dni) & (table['Nombre'] == nombre)],
+        'view_data_index_build': lambda: TableIndex(table, 'DNI'),
+        'view_data_index_lookup': lambda: index.lookup(dni),
+        'masters_next_id': lambda: backend.append(new_client, clientes_file, 'ID'),
+        'analysis_aggregate_build': lambda: SessionAggregates(table),
+        'analysis_aggregate_add_row': lambda: aggregates.add_rows(new_row),
+    }
+    try:
+        pyg = lazy_import('pygwalker')
+        frame = aggregates.to_frame()
+        cases['analysis_render'] = lambda: pyg.to_html(frame)
+    except ImportError:
+        pass
+
+    return {name: measure(func, repeat) for name, func in cases.items()}
+
+
+def compare(current, previous, threshold):
+    regressions = []
+    for key, result in current['results'].items():
+        for case, values in result.items():
+            before = previous['results'].get(key, {}).get(case)
+            if before and before['seconds'] > 0:
+                ratio = values['seconds'] / before['seconds']
+                flag = '  REGRESSION' if ratio > 1 + threshold else ''
+                print(f'{key:>18} {case:<26} {before["seconds"]:10.4f}s -> {values["seconds"]:10.4f}s  x{ratio:5.2f}{flag}')
+                if flag:
+                    regressions.append((key, case))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark de los caminos críticos de acceso a datos")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--backends', nargs='+', default=['sqlite'], choices=['sqlite', 'excel'])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--compare', help="resultados anteriores (.json) o 'latest'")
+    parser.add_argument('--threshold', type=float, default=0.2, help="ralentización relativa que cuenta como regresión")
+    args = parser.parse_args()
+
+    previous = None
+    if args.compare == 'latest':
+        runs = sorted(glob.glob(os.path.join(RESULTS_DIR, '*.json')))
+        args.compare = runs[-1] if runs else None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            previous = json.load(f)
+
+    current = {'started': datetime.now().isoformat(timespec='seconds'), 'results': {}}
+    with tempfile.TemporaryDirectory() as workdir:
+        for backend_name in args.backends:
+            for rows in args.sizes:
+                key = f'{backend_name}/{rows}'
+                print(f'Running {key}...', flush=True)
+                current['results'][key] = run_size(rows, backend_name, args.repeat, workdir)
+                for case, values in current['results'][key].items():
+                    print(f'  {case:<26} {values["seconds"]:10.4f}s  {values["peak_mb"]:9.1f} MB')
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = os.path.join(RESULTS_DIR, datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(current, f, indent=2)
+    print(f'Results saved to {output}')
+
+    if previous:
+        regressions = compare(current, previous, args.threshold)
+        if regressions:
+            raise SystemExit(f'{len(regressions)} regressions above {args.threshold:.0%}')
@@ -0,0 +1,119 @@
+import pandas as pd
+
+DNI_LETTERS = 'TRWAGMYFPDXBNJZSQVHLCKE'
+PROFESSIONAL_TYPES = ['Fisioterapeuta', 'Recuperador', 'Entrenador']
+MASTER_COLUMNS = ['ID', 'Nombre', 'Apellidos', 'Direccion', 'DNI', 'Telefono', 'Municipio', 'Codigo Postal']
+
+# Columns, required columns, accepted numeric ranges and whole-number
+# columns (stored as integers) of each batch kind
+SCHEMAS = {
+    'sesiones': {
+        'columns': ['Fecha', 'Nombre', 'DNI', 'Posición Corporal', 'Nombre Ejercicio', 'Repeticiones', 'Tiempo (min)', 'Kilos'],
+        'required': ['Fecha', 'Nombre', 'DNI', 'Posición Corporal', 'Nombre Ejercicio'],
+        'ranges': {'Repeticiones': (0, 1000), 'Tiempo (min)': (0, 600), 'Kilos': (0, 500)},
+        'integers': ['Repeticiones', 'Tiempo (min)'],
+    },
+    'profesionales': {
+        'columns': MASTER_COLUMNS + ['Tipo'],
+        'required': ['Nombre', 'Apellidos', 'DNI', 'Tipo'],
+        'ranges': {},
+        'integers': [],
+    },
+    'clientes': {
+        'columns': MASTER_COLUMNS,
+        'required': ['Nombre', 'Apellidos', 'DNI'],
+        'ranges': {},
+        'integers': [],
+    },
+}
+
+
+# Reads an uploaded CSV/XLSX with every cell as text, so validation sees
+# exactly what was typed (leading zeros in DNIs, postcodes...)
+def read_batch(file):
+    if file.name.endswith('.csv'):
+        df = pd.read_csv(file, dtype=str, keep_default_na=False)
+    else:
+        df = pd.read_excel(file, dtype=str, keep_default_na=False)
+    df.columns = [str(column).strip() for column in df.columns]
+    return df.apply(lambda column: column.str.strip())
+
+
+# DNI (8 digits + check letter) or NIE (X/Y/Z + 7 digits + check letter)
+def valid_dni(values):
+    values = values.str.upper()
+    parts = values.str.extract(r'^([XYZ]?)(\d{7,8})([A-Z])$')
+    well_formed = parts[1].notna() & ((parts[0] == '') == (parts[1].str.len() == 8))
+    prefix = parts[0].fillna('').map({'': '', 'X': '0', 'Y': '1', 'Z': '2'})
+    numbers = pd.to_numeric(prefix + parts[1].fillna('0'), errors='coerce').fillna(0).astype('int64')
+    expected = numbers.mod(23).map(dict(enumerate(DNI_LETTERS)))
+    return well_formed & (expected == parts[2])
+
+
+def row_errors(df, mask, column, message):
+    rows = df.index[mask]
+    # +2: one for the header row, one because spreadsheets count from 1
+    return pd.DataFrame({'Fila': rows + 2, 'Columna': column, 'Error': message})
+
+
+# Validates a whole batch at once. `catalogue` holds the known exercises
+# (POSICIÓN CORPORAL / NOMBRE EJERCICIO) and `existing` the rows already
+# stored, for duplicate checks. Returns (rows ready to append, errors), with
+# errors as one line per problem: Fila, Columna, Error.
+def validate_batch(df, kind, catalogue=None, existing=None):
+    schema = SCHEMAS[kind]
+    df = df.reset_index(drop=True)
+    errors = []
+
+    missing = [column for column in schema['required'] if column not in df.columns]
+    if missing:
+        errors = pd.DataFrame({'Fila': 1, 'Columna': missing, 'Error': 'Columna obligatoria ausente'})
+        return df.iloc[0:0], errors
+    rows = df.reindex(columns=[column for column in schema['columns'] if column in df.columns or column != 'ID'], fill_value='')
+
+    for column in schema['required']:
+        errors.append(row_errors(rows, rows[column] == '', column, 'Valor obligatorio vacío'))
+
+    rows['DNI'] = rows['DNI'].str.upper()
+    errors.append(row_errors(rows, (rows['DNI'] != '') & ~valid_dni(rows['DNI']), 'DNI', 'DNI/NIE no válido'))
+
+    for column, (low, high) in schema['ranges'].items():
+        text = rows[column].str.replace(',', '.', regex=False)
+        values = pd.to_numeric(text.where(text != '', '0'), errors='coerce')
+        errors.append(row_errors(rows, values.isna(), column, 'No es un número'))
+        errors.append(row_errors(rows, (values < low) | (values > high), column, f'Fuera de rango ({low}-{high})'))
+        if column in schema['integers']:
+            errors.append(row_errors(rows, values % 1 != 0, column, 'Debe ser un número entero'))
+        rows[column] = values
+
+    if kind == 'sesiones':
+        # ISO dates first, then the dd/mm/yyyy style of Spanish spreadsheets
+        fechas = pd.to_datetime(rows['Fecha'], errors='coerce', format='ISO8601')
+        fechas = fechas.fillna(pd.to_datetime(rows['Fecha'], errors='coerce', dayfirst=True, format='mixed'))
+        errors.append(row_errors(rows, (rows['Fecha'] != '') & fechas.isna(), 'Fecha', 'Fecha no válida'))
+        rows['Fecha'] = fechas.dt.strftime('%Y-%m-%d')
+        if catalogue is not None:
+            known = pd.MultiIndex.from_frame(catalogue[['POSICIÓN CORPORAL', 'NOMBRE EJERCICIO']].dropna().astype(str))
+            pairs = pd.MultiIndex.from_frame(rows[['Posición Corporal', 'Nombre Ejercicio']])
+            unknown = ~pairs.isin(known) & (rows['Nombre Ejercicio'] != '')
+            errors.append(row_errors(rows, unknown, 'Nombre Ejercicio', 'Ejercicio desconocido para esa posición corporal'))
+    else:
+        if kind == 'profesionales':
+            errors.append(row_errors(rows, ~rows['Tipo'].isin(PROFESSIONAL_TYPES) & (rows['Tipo'] != ''), 'Tipo',
+                                     f"Tipo no válido ({', '.join(PROFESSIONAL_TYPES)})"))
+        dnis = rows['DNI']
+        errors.append(row_errors(rows, dnis.duplicated(keep=False) & (dnis != ''), 'DNI', 'DNI repetido en el lote'))
+        if existing is not None and 'DNI' in existing:
+            stored = existing['DNI'].dropna().astype(str).str.strip().str.upper()
+            errors.append(row_errors(rows, dnis.isin(stored) & (dnis != ''), 'DNI', 'DNI ya registrado'))
+        if 'ID' in rows:
+            ids = pd.to_numeric(rows['ID'], errors='coerce')
+            errors.append(row_errors(rows, ids.isna() | (ids <= 0) | (ids % 1 != 0), 'ID', 'ID no válido'))
+            errors.append(row_errors(rows, ids.duplicated(keep=False) & ids.notna(), 'ID', 'ID repetido en el lote'))
+            if existing is not None and 'ID' in existing:
+                stored = pd.to_numeric(existing['ID'], errors='coerce').dropna()
+                errors.append(row_errors(rows, ids.isin(stored), 'ID', 'ID ya registrado'))
+            rows['ID'] = ids.fillna(0).astype('int64')
+
+    errors = pd.concat(errors, ignore_index=True).sort_values(['Fila', 'Columna'], kind='stable', ignore_index=True)
+    return rows, errors
@@ -0,0 +1,73 @@
+import os
+import threading
+from collections import OrderedDict
+
+
+# (path, mtime, size) for each path; changes whenever any of the files is rewritten
+def file_signature(*paths):
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((path, stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append((path, None, None))
+    return tuple(signature)
+
+
+# Process-wide LRU cache of parsed tables (and objects derived from them).
+# Keys are tuples whose second element is the source file, e.g.
+# ('table', 'datos_pacientes.xlsx') or ('index', 'clientes.xlsx', 'ID').
+class TableCache:
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, signature, loader):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == signature:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return entry[1]
+            self.misses += 1
+        value = loader()
+        with self.lock:
+            self.entries[key] = (signature, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return value
+
+    # The cached value if it is current, without loading it otherwise
+    def peek(self, key, signature):
+        with self.lock:
+            entry = self.entries.get(key)
+            return entry[1] if entry is not None and entry[0] == signature else None
+
+    # Called after we append `rows` to `file`, with the file's signature just
+    # before and just after our write. Entries that were current before it and
+    # can absorb the rows in place (objects with an add_rows method, e.g.
+    # indexes) are updated and re-stamped; the rest are dropped, including
+    # entries already missing rows someone else wrote in the meantime.
+    def apply_write(self, file, before, after, rows=None):
+        with self.lock:
+            for key in [key for key in self.entries if key[1] == file]:
+                signature, value = self.entries[key]
+                if rows is not None and signature == before and hasattr(value, 'add_rows'):
+                    value.add_rows(rows)
+                    self.entries[key] = (after, value)
+                else:
+                    del self.entries[key]
+
+    def invalidate(self, file=None):
+        with self.lock:
+            for key in [key for key in self.entries if file is None or key[1] == file]:
+                del self.entries[key]
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses}
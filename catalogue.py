@@ -0,0 +1,148 @@
+import os
+import sys
+
+import pandas as pd
+
+import storage
+
+POSITION_COLUMN = 'POSICIÓN CORPORAL'
+NAME_COLUMN = 'NOMBRE EJERCICIO'
+ID_COLUMN = 'ID EJERCICIO'
+
+
+def normalize_name(value):
+    return ' '.join(str(value).split()).casefold()
+
+
+# Gives every (position, exercise) pair of the workbook a permanent ID.
+# Pairs that already have one keep it, new ones get max + 1, so the IDs
+# stored in session rows stay valid when the workbook is edited. Also
+# returns which pairs got a new ID (a boolean mask).
+def assign_ids(df):
+    df = df.dropna(subset=[POSITION_COLUMN, NAME_COLUMN]).copy()
+    df[POSITION_COLUMN] = df[POSITION_COLUMN].astype(str).str.strip()
+    df[NAME_COLUMN] = df[NAME_COLUMN].astype(str).str.strip()
+    df = df.drop_duplicates(subset=[POSITION_COLUMN, NAME_COLUMN], ignore_index=True)
+    ids = pd.to_numeric(df[ID_COLUMN], errors='coerce') if ID_COLUMN in df else pd.Series(float('nan'), index=df.index)
+    ids = ids.mask(ids.duplicated())
+    missing = ids.isna()
+    first = int(ids.max()) + 1 if ids.notna().any() else 1
+    ids[missing] = range(first, first + int(missing.sum()))
+    df[ID_COLUMN] = ids.astype('int64')
+    return df[[ID_COLUMN, POSITION_COLUMN, NAME_COLUMN]], missing
+
+
+# Lookup structures compiled once per version of ejercicios_pacientes.xlsx:
+# position -> exercise names, (position, name) -> ID and name -> ID.
+# Exercises without an ID (<NA>) are listed but have no ID to look up.
+class ExerciseCatalogue:
+    def __init__(self, df):
+        self.frame = df.reset_index(drop=True)
+        positions = self.frame[POSITION_COLUMN].tolist()
+        names = self.frame[NAME_COLUMN].tolist()
+        self.positions = list(dict.fromkeys(positions))
+        self.by_position = {position: [] for position in self.positions}
+        for position, name in zip(positions, names):
+            self.by_position[position].append(name)
+        self.names = list(dict.fromkeys(names))
+        with_ids = self.frame.dropna(subset=[ID_COLUMN])
+        ids = with_ids[ID_COLUMN].astype('int64').tolist()
+        self.pair_ids = {(normalize_name(position), normalize_name(name)): id_
+                         for id_, position, name in zip(ids, with_ids[POSITION_COLUMN], with_ids[NAME_COLUMN])}
+        self.name_ids = {}
+        for id_, name in zip(ids, with_ids[NAME_COLUMN]):
+            self.name_ids.setdefault(normalize_name(name), id_)
+        # Pairs without an ID must not borrow the ID of a namesake in another position
+        self.unnumbered = {(normalize_name(position), normalize_name(name)) for position, name, id_
+                           in zip(positions, names, self.frame[ID_COLUMN]) if pd.isna(id_)}
+
+    def __len__(self):
+        return len(self.frame)
+
+    # Exercises of the given positions (all of them when none is given)
+    def exercises(self, positions=None):
+        if not positions:
+            return self.names
+        if isinstance(positions, str):
+            positions = [positions]
+        return list(dict.fromkeys(name for position in positions for name in self.by_position.get(position, [])))
+
+    # Canonical ID of an exercise, None if it is not in the catalogue or
+    # has no ID in the workbook yet
+    def exercise_id(self, name, position=None):
+        if position is not None:
+            pair = (normalize_name(position), normalize_name(name))
+            if pair in self.unnumbered:
+                return None
+            found = self.pair_ids.get(pair)
+            if found is not None:
+                return found
+        return self.name_ids.get(normalize_name(name))
+
+    # IDs for a whole session table at once (<NA> for unknown exercises)
+    def ids_for(self, df, position_column='Posición Corporal', name_column='Nombre Ejercicio'):
+        names = df[name_column].map(normalize_name)
+        pairs = pd.Series(list(zip(df[position_column].map(normalize_name), names)), index=df.index)
+        ids = pairs.map(self.pair_ids).fillna(names.map(self.name_ids))
+        return ids.mask(pairs.isin(self.unnumbered)).astype('Int64')
+
+
+def read_workbook(file):
+    if not os.path.exists(file):
+        return pd.DataFrame(columns=[ID_COLUMN, POSITION_COLUMN, NAME_COLUMN])
+    return pd.read_excel(file)
+
+
+# Reads the catalogue straight from the workbook, which stays the source of
+# truth. Only IDs written in the workbook are handed out: an ID made up in
+# memory would point at another exercise once rows are inserted or moved,
+# so sessions of exercises without one are saved without an ID until
+# `python catalogue.py ids` writes them in.
+def load_catalogue(file):
+    df, new = assign_ids(read_workbook(file))
+    df[ID_COLUMN] = df[ID_COLUMN].astype('Int64').mask(new)
+    return ExerciseCatalogue(df)
+
+
+# Writes the IDs into the workbook, keeping every other column and row.
+# Returns the number of pairs that got a new ID.
+def persist_ids(file):
+    with storage.file_lock(file):
+        df = read_workbook(file)
+        catalogue, new = assign_ids(df)
+        if not new.any():
+            return 0
+        ids = dict(zip(zip(catalogue[POSITION_COLUMN], catalogue[NAME_COLUMN]), catalogue[ID_COLUMN]))
+        pairs = pd.Series(list(zip(df[POSITION_COLUMN].astype(str).str.strip(),
+                                   df[NAME_COLUMN].astype(str).str.strip())), index=df.index)
+        if ID_COLUMN not in df:
+            df.insert(0, ID_COLUMN, None)
+        df[ID_COLUMN] = pairs.map(ids).astype('Int64')
+        storage.atomic_to_excel(df, file)
+    return int(new.sum())
+
+
+# Fills in the exercise ID of session rows saved before IDs existed.
+# Run it as a one-off migration, with the app stopped; the catalogue IDs
+# are written to the workbook first so the ones stored here stay valid.
+def backfill_session_ids(file, catalogue_file='ejercicios_pacientes.xlsx'):
+    persist_ids(catalogue_file)
+    catalogue = load_catalogue(catalogue_file)
+    df = storage.load_table(file, [])
+    ids = pd.to_numeric(df['ID Ejercicio'], errors='coerce').astype('Int64') if 'ID Ejercicio' in df else None
+    df['ID Ejercicio'] = catalogue.ids_for(df) if ids is None else ids.fillna(catalogue.ids_for(df))
+    storage.save_table(df, file)
+    return int(df['ID Ejercicio'].isna().sum())
+
+
+if __name__ == '__main__':
+    # python catalogue.py ids [ejercicios_pacientes.xlsx]
+    # python catalogue.py backfill datos_pacientes.xlsx
+    if sys.argv[1:2] == ['ids']:
+        path = sys.argv[2] if len(sys.argv) > 2 else 'ejercicios_pacientes.xlsx'
+        print(f'{path}: {persist_ids(path)} exercises got a new ID')
+    elif sys.argv[1:2] == ['backfill']:
+        for path in sys.argv[2:]:
+            print(f'{path}: {backfill_session_ids(path)} rows with unknown exercises')
+    else:
+        sys.exit("Usage: python catalogue.py ids [catalogue file] | backfill <sessions file>")
@@ -0,0 +1,52 @@
+import threading
+
+import pandas as pd
+
+
+# DNI/ID values arrive as text from the forms and as str/float from the
+# workbooks, so both sides are normalised the same way
+def normalize_key(value):
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip().upper()
+
+
+# In-memory hash index over one column of a table. Rows appended after the
+# build are kept in separate chunks so adding a row never copies the table.
+class TableIndex:
+    def __init__(self, df, key_column):
+        self.key_column = key_column
+        self.columns = list(df.columns)
+        self.chunks = []
+        self.positions = {}
+        self.lock = threading.Lock()
+        self.add_rows(df)
+
+    def __len__(self):
+        return sum(len(chunk) for chunk in self.chunks)
+
+    def add_rows(self, rows):
+        rows = rows.reset_index(drop=True)
+        keys = rows[self.key_column].map(normalize_key) if self.key_column in rows else pd.Series(dtype=object)
+        with self.lock:
+            chunk_no = len(self.chunks)
+            self.chunks.append(rows)
+            for column in rows.columns:
+                if column not in self.columns:
+                    self.columns.append(column)
+            valid = keys.dropna()
+            for key, labels in valid.index.groupby(valid.values).items():
+                self.positions.setdefault(key, []).append((chunk_no, labels.to_numpy()))
+
+    def lookup(self, key):
+        with self.lock:
+            matches = list(self.positions.get(normalize_key(key), []))
+        if not matches:
+            return pd.DataFrame(columns=self.columns)
+        parts = [self.chunks[chunk_no].iloc[positions] for chunk_no, positions in matches]
+        return pd.concat(parts, ignore_index=True).reindex(columns=self.columns)
+
+    def __contains__(self, key):
+        return normalize_key(key) in self.positions
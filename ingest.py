@@ -0,0 +1,117 @@
+import hashlib
+import os
+
+import openpyxl
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from schemas import text
+
+UPLOAD_CACHE_DIR = os.path.join('.cache', 'uploads')
+CHUNK_ROWS = 50000
+
+
+# SHA-256 of an uploaded file, read in blocks so large files are not copied
+def content_hash(file, block_size=1 << 20):
+    digest = hashlib.sha256()
+    file.seek(0)
+    for block in iter(lambda: file.read(block_size), b''):
+        digest.update(block)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+# Smallest numeric dtypes that hold the values, and categories for text
+# columns (as strings, so a column mixing numbers and codes stays one type)
+def downcast(df):
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_integer_dtype(series):
+            df[column] = pd.to_numeric(series, downcast='integer')
+        elif pd.api.types.is_float_dtype(series):
+            df[column] = pd.to_numeric(series, downcast='float')
+        elif pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+            df[column] = text(series).astype('category')
+    return df
+
+
+# Concatenate downcast chunks, merging categorical columns so they stay
+# categorical. Each chunk infers its own dtypes, so a column can be numeric
+# in one chunk and text in another (numeric codes first, alphanumeric ones
+# later): such a column is turned to text in every chunk before merging.
+def concat_chunks(chunks):
+    if not chunks:
+        return pd.DataFrame()
+    columns = {}
+    for column in chunks[0].columns:
+        parts = [chunk[column] for chunk in chunks]
+        categorical = [isinstance(part.dtype, pd.CategoricalDtype) for part in parts]
+        if any(categorical) and not all(categorical):
+            parts = [text(part).astype('category') for part in parts]
+        if all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            columns[column] = pd.Series(union_categoricals(parts, ignore_order=True), name=column)
+        else:
+            columns[column] = pd.concat(parts, ignore_index=True)
+    return downcast(pd.DataFrame(columns))
+
+
+def csv_chunks(file, chunk_rows, progress, total_bytes):
+    for chunk in pd.read_csv(file, chunksize=chunk_rows):
+        yield chunk
+        if progress and total_bytes:
+            progress(min(1.0, file.tell() / total_bytes))
+
+
+def excel_chunks(file, chunk_rows, progress):
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        sheet = workbook.active
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        total_rows = max((sheet.max_row or 1) - 1, 1)
+        batch, done = [], 0
+        for row in rows:
+            batch.append(row)
+            if len(batch) == chunk_rows:
+                done += len(batch)
+                yield pd.DataFrame(batch, columns=header)
+                batch = []
+                if progress:
+                    progress(min(1.0, done / total_rows))
+        if batch:
+            yield pd.DataFrame(batch, columns=header)
+    finally:
+        workbook.close()
+
+
+# Columns expected by the template that are missing from the upload, and
+# columns in the upload the template does not know
+def validate_columns(columns, template_columns):
+    missing = [column for column in template_columns if column not in columns]
+    extra = [column for column in columns if column not in template_columns]
+    return missing, extra
+
+
+# Reads an uploaded CSV/XLSX in chunks, downcasting each chunk as it arrives,
+# and caches the result as Parquet keyed by the file's content hash.
+# Returns (df, from_cache).
+def ingest_upload(file, chunk_rows=CHUNK_ROWS, progress=None, cache_dir=UPLOAD_CACHE_DIR):
+    cache_file = os.path.join(cache_dir, content_hash(file) + '.parquet')
+    if os.path.exists(cache_file):
+        return pd.read_parquet(cache_file), True
+
+    if file.name.endswith('.csv'):
+        chunks = csv_chunks(file, chunk_rows, progress, getattr(file, 'size', None))
+    else:
+        chunks = excel_chunks(file, chunk_rows, progress)
+    df = concat_chunks([downcast(chunk) for chunk in chunks])
+    if progress:
+        progress(1.0)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_file = cache_file + '.tmp'
+    df.to_parquet(tmp_file, index=False)
+    os.replace(tmp_file, cache_file)
+    return df, False
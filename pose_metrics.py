@@ -0,0 +1,101 @@
+import threading
+
+import numpy as np
+
+from pose_pipeline import LANDMARK_FIELDS, NUM_LANDMARKS
+
+# Joint -> (a, vertex, c) MediaPipe landmark indices; the angle is measured at the vertex
+JOINTS = {
+    'Hombro izquierdo': (23, 11, 13),
+    'Hombro derecho': (24, 12, 14),
+    'Codo izquierdo': (11, 13, 15),
+    'Codo derecho': (12, 14, 16),
+    'Cadera izquierda': (11, 23, 25),
+    'Cadera derecha': (12, 24, 26),
+    'Rodilla izquierda': (23, 25, 27),
+    'Rodilla derecha': (24, 26, 28),
+}
+
+
+# Preallocated ring buffer of the last `capacity` frames of landmarks.
+# The writer fills slot() in place and then commits it, so recording a
+# frame allocates nothing.
+class LandmarkBuffer:
+    def __init__(self, capacity=9000):
+        self.data = np.full((capacity, NUM_LANDMARKS, LANDMARK_FIELDS), np.nan, dtype=np.float32)
+        self.capacity = capacity
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def slot(self):
+        return self.data[self.count % self.capacity]
+
+    def commit(self):
+        with self.lock:
+            self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    # Chronological copy of the last n frames (all buffered frames by default)
+    def window(self, n=None):
+        with self.lock:
+            size = len(self) if n is None else min(n, len(self))
+            end = self.count % self.capacity
+            start = end - size
+            if start >= 0:
+                return self.data[start:end].copy()
+            return np.concatenate([self.data[start:], self.data[:end]])
+
+
+# (frames, joints) array of angles in degrees, from the x/y image coordinates
+def joint_angles(landmarks, joints=JOINTS):
+    indices = np.array(list(joints.values()))
+    points = landmarks[:, indices, :2]
+    ba = points[:, :, 0] - points[:, :, 1]
+    bc = points[:, :, 2] - points[:, :, 1]
+    cosine = np.sum(ba * bc, axis=-1) / (np.linalg.norm(ba, axis=-1) * np.linalg.norm(bc, axis=-1))
+    return np.degrees(np.arccos(np.clip(cosine, -1.0, 1.0)))
+
+
+def range_of_motion(angles):
+    if not np.isfinite(angles).any():
+        return np.zeros(angles.shape[1:], dtype=np.float32)
+    return np.nanmax(angles, axis=0) - np.nanmin(angles, axis=0)
+
+
+# Counts full cycles of one angle series using hysteresis thresholds (by
+# default 30% and 70% of the observed range), so jitter near a single
+# threshold is not counted as a repetition
+def count_repetitions(angles, low=None, high=None):
+    valid = angles[np.isfinite(angles)]
+    if len(valid) < 2:
+        return 0
+    lowest, highest = valid.min(), valid.max()
+    low = lowest + 0.3 * (highest - lowest) if low is None else low
+    high = lowest + 0.7 * (highest - lowest) if high is None else high
+    state = np.full(len(valid), -1)
+    state[valid <= low] = 0
+    state[valid >= high] = 1
+    # Frames between the thresholds keep the last decided state
+    decided = state >= 0
+    if not decided.any():
+        return 0
+    last = np.maximum.accumulate(np.where(decided, np.arange(len(state)), 0))
+    state = state[last][np.argmax(decided):]
+    return int(np.count_nonzero(np.diff(state)) // 2)
+
+
+# Per-joint range of motion and repetitions for a window of landmarks, plus
+# suggested values for the session form taken from the joint that moved most
+def summarize(landmarks, fps):
+    angles = joint_angles(landmarks)
+    rom = range_of_motion(angles)
+    reps = [count_repetitions(angles[:, j]) for j in range(angles.shape[1])]
+    main = int(np.argmax(rom))
+    return {
+        'joints': {name: {'rom': float(rom[j]), 'repeticiones': reps[j]} for j, name in enumerate(JOINTS)},
+        'articulacion_principal': list(JOINTS)[main],
+        'repeticiones': reps[main],
+        'tiempo_min': int(round(len(landmarks) / fps / 60)) if fps else 0,
+    }
@@ -0,0 +1,289 @@
+import math
+import sys
+import threading
+import time
+from collections import deque
+
+import cv2
+import mediapipe as mp
+import numpy as np
+
+# Landmarks are stored as float32 [x, y, z, visibility] for the 33 pose points;
+# frames without a detected pose are all NaN
+NUM_LANDMARKS = 33
+LANDMARK_FIELDS = 4
+
+
+# Bounded queue that drops the oldest item when full, so a slow consumer
+# always gets the most recent frame instead of an ever-growing backlog.
+# With drop_oldest=False the producer waits instead (offline processing).
+class FrameQueue:
+    def __init__(self, maxsize=2, drop_oldest=True):
+        self.items = deque(maxlen=maxsize)
+        self.drop_oldest = drop_oldest
+        self.condition = threading.Condition()
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, item):
+        with self.condition:
+            if not self.drop_oldest:
+                self.condition.wait_for(lambda: len(self.items) < self.items.maxlen or self.closed)
+            if len(self.items) == self.items.maxlen:
+                self.dropped += 1
+            self.items.append(item)
+            self.condition.notify_all()
+
+    # Returns None on timeout or once the queue is closed and drained
+    def get(self, timeout=None):
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.items or self.closed, timeout):
+                return None
+            item = self.items.popleft() if self.items else None
+            self.condition.notify_all()
+            return item
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def __len__(self):
+        return len(self.items)
+
+
+def default_pose():
+    return mp.solutions.pose.Pose(min_tracking_confidence=0.5, min_detection_confidence=0.5)
+
+
+# Copy MediaPipe pose landmarks into a (33, 4) float32 array (reused if `out` is given)
+def landmarks_to_array(pose_landmarks, out=None):
+    if out is None:
+        out = np.empty((NUM_LANDMARKS, LANDMARK_FIELDS), dtype=np.float32)
+    if pose_landmarks is None:
+        out.fill(np.nan)
+        return out
+    for i, landmark in enumerate(pose_landmarks.landmark):
+        out[i] = (landmark.x, landmark.y, landmark.z, landmark.visibility)
+    return out
+
+
+# Same look as mediapipe's draw_landmarks, but drawn from a landmark array so
+# tracked (non-inferred) frames can be drawn too
+def draw_landmark_array(image, landmarks, visibility_threshold=0.5):
+    height, width = image.shape[:2]
+    visible = np.isfinite(landmarks[:, 0]) & (landmarks[:, 3] >= visibility_threshold)
+    points = np.round(np.nan_to_num(landmarks[:, :2]) * (width, height)).astype(int).tolist()
+    for a, b in mp.solutions.pose.POSE_CONNECTIONS:
+        if visible[a] and visible[b]:
+            cv2.line(image, points[a], points[b], (0, 255, 0), 2)
+    for i in np.flatnonzero(visible):
+        cv2.circle(image, points[i], 2, (0, 0, 255), 2)
+
+
+# Fills the frames between two detections by extrapolating each landmark at
+# the velocity observed between the last two detections
+class LandmarkTracker:
+    def __init__(self):
+        self.previous = None
+        self.last = None
+
+    def update(self, frame_no, landmarks):
+        self.previous, self.last = self.last, (frame_no, landmarks)
+
+    def predict(self, frame_no):
+        if self.last is None:
+            return np.full((NUM_LANDMARKS, LANDMARK_FIELDS), np.nan, dtype=np.float32)
+        last_no, last = self.last
+        if self.previous is None:
+            return last
+        previous_no, previous = self.previous
+        predicted = last + (last - previous) * ((frame_no - last_no) / (last_no - previous_no))
+        return np.where(np.isfinite(previous), predicted, last)
+
+
+# Chooses how often to run detection: every N frames, with N the smallest
+# value that lets the measured inference time keep up with the target FPS
+class SkipController:
+    def __init__(self, target_fps, max_skip=1):
+        self.target_fps = target_fps
+        self.max_skip = max_skip
+        self.every = 1
+        self.inference_time = None
+
+    def record(self, seconds):
+        if self.inference_time is None:
+            self.inference_time = seconds
+        else:
+            self.inference_time = 0.9 * self.inference_time + 0.1 * seconds
+        self.every = min(self.max_skip, max(1, math.ceil(self.inference_time * self.target_fps)))
+
+
+# Downscale an RGB frame to `width` pixels wide before inference (landmarks
+# are normalised, so they still apply to the full-size frame)
+def resize_for_inference(image, width):
+    height, current_width = image.shape[:2]
+    if not width or current_width <= width:
+        return image
+    return cv2.resize(image, (width, round(height * width / current_width)), interpolation=cv2.INTER_AREA)
+
+
+# Capture -> inference -> render, each stage on its own thread and linked by
+# drop-oldest queues. `source` is a camera index or a video file path; with
+# realtime=False a file is read as fast as inference allows (for testing).
+# If a landmark_buffer (pose_metrics.LandmarkBuffer) is given, every
+# processed frame's landmarks are written into it.
+# Performance mode: inference_width downscales frames before inference and
+# max_skip > 1 lets detection run only every N frames (N adapted to hold
+# target_fps), with landmarks tracked in between.
+# A recorder (recording.SessionRecorder) receives every raw frame with its
+# landmarks; it encodes on its own thread and is closed by stop().
+class PosePipeline:
+    def __init__(self, source=0, target_fps=15, queue_size=2, pose_factory=default_pose, realtime=True,
+                 landmark_buffer=None, inference_width=None, max_skip=1, recorder=None):
+        self.source = source
+        self.recorder = recorder
+        self.landmark_buffer = landmark_buffer
+        self.inference_width = inference_width
+        self.controller = SkipController(target_fps, max_skip)
+        self.target_fps = target_fps
+        self.realtime = realtime
+        self.pose_factory = pose_factory
+        self.captured = FrameQueue(queue_size, drop_oldest=realtime)
+        self.inferred = FrameQueue(queue_size, drop_oldest=realtime)
+        self.rendered = FrameQueue(queue_size, drop_oldest=realtime)
+        self.stop_event = threading.Event()
+        self.error = None
+        self.frames_rendered = 0
+        self.latencies = deque(maxlen=100)
+        self.render_times = deque(maxlen=100)
+        self.threads = []
+
+    def start(self):
+        self.capture = cv2.VideoCapture(self.source)
+        if not self.capture.isOpened():
+            self.error = f"No se pudo abrir la fuente de vídeo '{self.source}'."
+            return False
+        for target in (self.capture_loop, self.inference_loop, self.render_loop):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return True
+
+    def stop(self):
+        self.stop_event.set()
+        for queue in (self.captured, self.inferred, self.rendered):
+            queue.close()
+        for thread in self.threads:
+            thread.join(timeout=2)
+        if self.recorder is not None:
+            self.recorder.close()
+
+    @property
+    def running(self):
+        return any(thread.is_alive() for thread in self.threads)
+
+    def capture_loop(self):
+        interval = 1.0 / self.target_fps
+        next_frame = time.perf_counter()
+        frame_no = 0
+        try:
+            while not self.stop_event.is_set():
+                ret, frame = self.capture.read()
+                if not ret:
+                    if isinstance(self.source, int):
+                        self.error = "Error al capturar el frame de la cámara"
+                    break
+                self.captured.put((frame_no, time.perf_counter(), frame))
+                frame_no += 1
+                if self.realtime:
+                    next_frame += interval
+                    time.sleep(max(0.0, next_frame - time.perf_counter()))
+        finally:
+            self.capture.release()
+            self.captured.close()
+
+    def inference_loop(self):
+        try:
+            pose = self.pose_factory()
+            tracker = LandmarkTracker()
+            last_detection = None
+            try:
+                while True:
+                    item = self.captured.get()
+                    if item is None:
+                        break
+                    frame_no, captured_at, frame = item
+                    image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                    if last_detection is None or frame_no - last_detection >= self.controller.every:
+                        started = time.perf_counter()
+                        results = pose.process(resize_for_inference(image, self.inference_width))
+                        self.controller.record(time.perf_counter() - started)
+                        landmarks = landmarks_to_array(results.pose_landmarks)
+                        tracker.update(frame_no, landmarks)
+                        last_detection = frame_no
+                    else:
+                        landmarks = tracker.predict(frame_no)
+                    if self.landmark_buffer is not None:
+                        self.landmark_buffer.slot()[:] = landmarks
+                        self.landmark_buffer.commit()
+                    if self.recorder is not None:
+                        # Capture times let the recording account for the frames dropped so far
+                        self.recorder.put(frame_no, frame, landmarks, captured_at if self.realtime else None)
+                    self.inferred.put((frame_no, captured_at, image, landmarks))
+            finally:
+                pose.close()
+        except Exception as exc:
+            # Unblock the capture thread so the whole pipeline winds down
+            self.error = f"Error en la estimación de pose: {exc}"
+            self.stop_event.set()
+            self.captured.close()
+        finally:
+            self.inferred.close()
+
+    def render_loop(self):
+        try:
+            while True:
+                item = self.inferred.get()
+                if item is None:
+                    break
+                frame_no, captured_at, image, landmarks = item
+                draw_landmark_array(image, landmarks)
+                now = time.perf_counter()
+                self.latencies.append(now - captured_at)
+                self.render_times.append(now)
+                self.frames_rendered += 1
+                self.rendered.put((frame_no, image))
+        finally:
+            self.rendered.close()
+
+    # Latest annotated RGB frame as (frame_no, image), or None
+    def get_frame(self, timeout=None):
+        return self.rendered.get(timeout)
+
+    def stats(self):
+        fps = 0.0
+        if len(self.render_times) > 1:
+            fps = (len(self.render_times) - 1) / (self.render_times[-1] - self.render_times[0])
+        latency_ms = 1000 * sum(self.latencies) / len(self.latencies) if self.latencies else 0.0
+        return {
+            'fps': fps,
+            'latency_ms': latency_ms,
+            'frames': self.frames_rendered,
+            'dropped': self.captured.dropped + self.inferred.dropped + self.rendered.dropped,
+            'detect_every': self.controller.every,
+            'inference_ms': 1000 * (self.controller.inference_time or 0.0),
+        }
+
+
+if __name__ == '__main__':
+    # python pose_pipeline.py session.mp4  -> runs the pipeline on a file and prints stats
+    pipeline = PosePipeline(sys.argv[1], realtime=False)
+    if not pipeline.start():
+        sys.exit(pipeline.error)
+    while pipeline.get_frame() is not None:
+        pass
+    pipeline.stop()
+    if pipeline.error:
+        sys.exit(pipeline.error)
+    print(pipeline.stats())
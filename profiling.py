@@ -0,0 +1,149 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Opt-in: TECHEALTH_PROFILING=1 enables it for every session; admins can
+# also switch it on for their own session from the sidebar
+ENABLED = os.environ.get('TECHEALTH_PROFILING') == '1'
+METRICS_FILE = os.environ.get('TECHEALTH_METRICS_FILE', os.path.join('.cache', 'metrics.prom'))
+METRICS_PORT = int(os.environ.get('TECHEALTH_METRICS_PORT', 0))
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    return ','.join(f'{name}="{escape_label(value)}"' for name, value in labels)
+
+
+# Process-wide metrics: per (page, stage) timing summaries and gauges
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timings = {}
+        self.gauges = {}
+
+    def observe(self, page, stage, seconds):
+        with self.lock:
+            count, total, maximum = self.timings.get((page, stage), (0, 0.0, 0.0))
+            self.timings[(page, stage)] = (count + 1, total + seconds, max(maximum, seconds))
+
+    def set_gauge(self, name, value, **labels):
+        with self.lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    # Prometheus text exposition format
+    def to_prometheus(self):
+        with self.lock:
+            timings = sorted(self.timings.items())
+            gauges = sorted(self.gauges.items())
+        lines = ['# HELP techealth_stage_seconds Time spent in each named stage of a rerun',
+                 '# TYPE techealth_stage_seconds summary']
+        for (page, stage), (count, total, _) in timings:
+            labels = format_labels([('page', page), ('stage', stage)])
+            lines.append(f'techealth_stage_seconds_count{{{labels}}} {count}')
+            lines.append(f'techealth_stage_seconds_sum{{{labels}}} {total:.6f}')
+        lines.append('# TYPE techealth_stage_seconds_max gauge')
+        for (page, stage), (_, _, maximum) in timings:
+            labels = format_labels([('page', page), ('stage', stage)])
+            lines.append(f'techealth_stage_seconds_max{{{labels}}} {maximum:.6f}')
+        declared = set()
+        for (name, labels), value in gauges:
+            if name not in declared:
+                lines.append(f'# TYPE {name} gauge')
+                declared.add(name)
+            lines.append(f'{name}{{{format_labels(labels)}}} {value}' if labels else f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+    # Every session writes here at the end of a rerun, so each write goes
+    # through its own temporary file before being renamed into place
+    def write(self, path=METRICS_FILE):
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(self.to_prometheus())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+
+registry = MetricsRegistry()
+
+
+# Stage timings of one script run; a no-op when disabled
+class RunProfiler:
+    def __init__(self, enabled=ENABLED, page='app'):
+        self.enabled = enabled
+        self.page = page
+        self.stages = []
+
+    def record(self, stage, seconds):
+        if self.enabled:
+            self.stages.append((self.page, stage, seconds))
+            registry.observe(self.page, stage, seconds)
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+
+# Memory of every DataFrame held in the shared table cache
+def record_dataframe_memory(table_cache):
+    with table_cache.lock:
+        entries = list(table_cache.entries.items())
+    for key, (_, value) in entries:
+        if hasattr(value, 'memory_usage'):
+            registry.set_gauge('techealth_dataframe_bytes', int(value.memory_usage(deep=True).sum()), table=key[1])
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != '/metrics':
+            self.send_error(404)
+            return
+        body = registry.to_prometheus().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+server = None
+server_failed = False
+server_lock = threading.Lock()
+
+
+# Serve /metrics on TECHEALTH_METRICS_PORT (once per process; 0 disables it).
+# Called on every rerun: if the port cannot be bound the error is logged
+# once and the app carries on without the endpoint.
+def serve_metrics(port=METRICS_PORT):
+    global server, server_failed
+    with server_lock:
+        if server is not None or server_failed or not port:
+            return
+        try:
+            server = ThreadingHTTPServer(('127.0.0.1', port), MetricsHandler)
+        except OSError as exc:
+            server_failed = True
+            logging.getLogger(__name__).warning('Metrics endpoint disabled: cannot listen on port %s (%s)', port, exc)
+            return
+        threading.Thread(target=server.serve_forever, daemon=True).start()
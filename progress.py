@@ -0,0 +1,111 @@
+import sqlite3
+import sys
+from contextlib import closing
+
+import pandas as pd
+
+import storage
+from aggregates import MEASURES, group_totals
+from indexes import normalize_key
+
+PROGRESS_TABLE = 'progreso_semanal'
+META_TABLE = 'progreso_meta'
+KEY_COLUMNS = ['DNI', 'Nombre Ejercicio', 'Posición Corporal']
+VALUE_COLUMNS = MEASURES + ['Sesiones']
+COLUMNS = KEY_COLUMNS + ['Semana'] + VALUE_COLUMNS
+
+
+# Weekly totals per patient (DNI), exercise and body position, materialized
+# in SQLite. Saving sessions adds them with an UPSERT per touched week, so
+# the cost of a write or of a patient query does not grow with the log.
+# `rows` in the meta table counts the sessions folded in; when it differs
+# from the session table the summary is rebuilt from scratch. Until the
+# first rebuild there is no `rows` entry and no summary to add to, so
+# add_rows leaves it alone and the rebuild picks the rows up from the log.
+class ProgressStore:
+    def __init__(self, db_file=storage.DB_FILE):
+        self.db_file = db_file
+        with closing(self.connect()) as con:
+            keys = ', '.join(storage.quote(column) for column in KEY_COLUMNS + ['Semana'])
+            con.execute(f'CREATE TABLE IF NOT EXISTS {PROGRESS_TABLE} ('
+                        + ', '.join(f'{storage.quote(column)} TEXT NOT NULL' for column in KEY_COLUMNS + ['Semana']) + ', '
+                        + ', '.join(f'{storage.quote(column)} REAL NOT NULL' for column in VALUE_COLUMNS)
+                        + f', PRIMARY KEY ({keys}))')
+            con.execute(f'CREATE TABLE IF NOT EXISTS {META_TABLE} (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            con.commit()
+
+    def connect(self):
+        con = sqlite3.connect(self.db_file, timeout=30)
+        con.execute('PRAGMA journal_mode=WAL')
+        return con
+
+    # One row per key and week, with keys normalized like the indexes
+    def summarize(self, rows):
+        rows = rows.assign(DNI=rows['DNI'].map(normalize_key)) if 'DNI' in rows else rows
+        grouped = group_totals(rows, KEY_COLUMNS).reset_index()
+        grouped = grouped[grouped['DNI'] != '']
+        grouped['Semana'] = grouped['Semana'].dt.strftime('%Y-%m-%d').fillna('')
+        return grouped[COLUMNS]
+
+    def upsert(self, con, grouped):
+        placeholders = ', '.join('?' for _ in COLUMNS)
+        updates = ', '.join(f'{storage.quote(column)} = {storage.quote(column)} + excluded.{storage.quote(column)}'
+                            for column in VALUE_COLUMNS)
+        keys = ', '.join(storage.quote(column) for column in KEY_COLUMNS + ['Semana'])
+        con.executemany(f'INSERT INTO {PROGRESS_TABLE} VALUES ({placeholders}) '
+                        f'ON CONFLICT ({keys}) DO UPDATE SET {updates}',
+                        grouped.astype(object).itertuples(index=False, name=None))
+
+    def add_rows(self, rows):
+        grouped = self.summarize(rows)
+        with closing(self.connect()) as con:
+            con.execute('BEGIN IMMEDIATE')
+            if con.execute(f'SELECT 1 FROM {META_TABLE} WHERE name = ?', ('rows',)).fetchone() is None:
+                con.rollback()
+                return
+            self.upsert(con, grouped)
+            con.execute(f'INSERT INTO {META_TABLE} (name, value) VALUES (?, ?) '
+                        'ON CONFLICT (name) DO UPDATE SET value = value + excluded.value', ('rows', len(rows)))
+            con.commit()
+
+    def rebuild(self, df):
+        grouped = self.summarize(df)
+        with closing(self.connect()) as con:
+            con.execute('BEGIN IMMEDIATE')
+            con.execute(f'DELETE FROM {PROGRESS_TABLE}')
+            self.upsert(con, grouped)
+            con.execute(f'INSERT OR REPLACE INTO {META_TABLE} (name, value) VALUES (?, ?)', ('rows', len(df)))
+            con.commit()
+
+    # Number of session rows the summary accounts for, None before the first rebuild
+    def rows(self):
+        with closing(self.connect()) as con:
+            row = con.execute(f'SELECT value FROM {META_TABLE} WHERE name = ?', ('rows',)).fetchone()
+        return row[0] if row else None
+
+    # Weekly rows of one patient, oldest first (served by the primary key)
+    def patient(self, dni):
+        with closing(self.connect()) as con:
+            df = pd.read_sql_query(f'SELECT * FROM {PROGRESS_TABLE} WHERE DNI = ? ORDER BY Semana', con,
+                                   params=(normalize_key(dni),))
+        df['Semana'] = pd.to_datetime(df['Semana'], errors='coerce')
+        df['Sesiones'] = df['Sesiones'].astype(int)
+        return df
+
+
+# Totals of the weeks starting in the month of `day`, per measure. The
+# summary is weekly, so days before the first Monday of the month count in
+# the previous month's weeks (label it as weeks, not as calendar month).
+def month_totals(weekly, day):
+    month = weekly['Semana'].dt.to_period('M') == pd.Timestamp(day).to_period('M')
+    return weekly.loc[month, VALUE_COLUMNS].sum()
+
+
+if __name__ == '__main__':
+    # python progress.py rebuild [datos_pacientes.xlsx]
+    if sys.argv[1:2] != ['rebuild']:
+        sys.exit("Usage: python progress.py rebuild [sessions file]")
+    file = sys.argv[2] if len(sys.argv) > 2 else 'datos_pacientes.xlsx'
+    sessions = storage.load_table(file, [])
+    ProgressStore().rebuild(sessions)
+    print(f'{file}: {len(sessions)} sessions summarized')
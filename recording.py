@@ -0,0 +1,217 @@
+import glob
+import os
+import struct
+import sys
+import threading
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from batch_pose import patient_dir
+from pose_pipeline import LANDMARK_FIELDS, NUM_LANDMARKS, FrameQueue, draw_landmark_array
+
+RECORDINGS_DIR = 'recordings'
+# Codecs tried in order; the first one this OpenCV build can open is used.
+# mp4v is widely available, MJPG works everywhere at a larger file size.
+CODECS = [('mp4v', '.mp4'), ('avc1', '.mp4'), ('MJPG', '.avi')]
+
+# Landmark sidecar: a 16-byte header, then one fixed-size record per video
+# frame in the order the frames were written, so record i belongs to frame i
+# and seeking is a single offset computation. Frames dropped before or during
+# recording leave gaps in time, so each record carries its capture time
+# (seconds from the first frame) and the header the measured frame rate;
+# the nominal rate of the video file is only right when nothing was dropped.
+SIDECAR_MAGIC = b'TKLM'
+SIDECAR_VERSION = 2
+SIDECAR_HEADER = struct.Struct('<4sHHHHf')
+SIDECAR_RECORD = np.dtype([('frame_no', '<u4'), ('timestamp', '<f4'),
+                           ('landmarks', '<f2', (NUM_LANDMARKS, LANDMARK_FIELDS))])
+# Version 1 had no timestamps: frames are taken as evenly spaced at the header fps
+SIDECAR_RECORD_V1 = np.dtype([('frame_no', '<u4'), ('landmarks', '<f2', (NUM_LANDMARKS, LANDMARK_FIELDS))])
+
+
+# Base path (without extension) for a new recording of a patient
+def new_recording(dni, output_dir=RECORDINGS_DIR):
+    directory = patient_dir(dni, output_dir)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, datetime.now().strftime('%Y%m%d-%H%M%S'))
+
+
+def open_writer(base_path, fps, size):
+    for fourcc, extension in CODECS:
+        writer = cv2.VideoWriter(base_path + extension, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+        if writer.isOpened():
+            return writer, base_path + extension
+        writer.release()
+    return None, None
+
+
+# Writes the raw camera frames to a video file and their landmarks to a
+# sidecar on its own thread. put() never blocks: when encoding falls behind,
+# the oldest queued frames are dropped (and neither file gets them, so both
+# stay aligned). drop_oldest=False makes put() wait instead (offline use).
+# `fps` is the nominal rate given to the video file; the sidecar gets the
+# rate measured from the capture times once the recording is closed.
+class SessionRecorder:
+    def __init__(self, base_path, fps, queue_size=64, drop_oldest=True):
+        self.base_path = base_path
+        self.fps = fps
+        self.measured_fps = None
+        self.queue = FrameQueue(queue_size, drop_oldest=drop_oldest)
+        self.video_path = None
+        self.sidecar_path = base_path + '.lmk'
+        self.frames_written = 0
+        self.error = None
+        self.thread = threading.Thread(target=self.write_loop, daemon=True)
+        self.thread.start()
+
+    # `frame` is the BGR frame as captured; it must not be modified afterwards.
+    # `captured_at` is its perf_counter() capture time; without it (files
+    # read offline, nothing dropped) frames are spaced by the nominal fps.
+    def put(self, frame_no, frame, landmarks, captured_at=None):
+        self.queue.put((frame_no, frame, landmarks, captured_at))
+
+    @property
+    def dropped(self):
+        return self.queue.dropped
+
+    def write_loop(self):
+        writer = None
+        record = np.zeros(1, dtype=SIDECAR_RECORD)
+        first = timestamp = None
+        with open(self.sidecar_path, 'wb') as sidecar:
+            sidecar.write(SIDECAR_HEADER.pack(SIDECAR_MAGIC, SIDECAR_VERSION, NUM_LANDMARKS, LANDMARK_FIELDS, 0, self.fps))
+            try:
+                while True:
+                    item = self.queue.get()
+                    if item is None:
+                        break
+                    frame_no, frame, landmarks, captured_at = item
+                    if writer is None:
+                        writer, self.video_path = open_writer(self.base_path, self.fps, (frame.shape[1], frame.shape[0]))
+                        if writer is None:
+                            self.error = "Ningún códec de vídeo disponible para grabar."
+                            break
+                    writer.write(frame)
+                    if first is None:
+                        first = (frame_no, captured_at)
+                    if captured_at is None or first[1] is None:
+                        timestamp = (frame_no - first[0]) / self.fps
+                    else:
+                        timestamp = captured_at - first[1]
+                    record['frame_no'] = frame_no
+                    record['timestamp'] = timestamp
+                    record['landmarks'] = landmarks
+                    sidecar.write(record.tobytes())
+                    self.frames_written += 1
+            except Exception as exc:
+                self.error = f"Error al grabar la sesión: {exc}"
+            finally:
+                if writer is not None:
+                    writer.release()
+                if self.frames_written > 1 and timestamp > 0:
+                    self.measured_fps = (self.frames_written - 1) / timestamp
+                    sidecar.seek(0)
+                    sidecar.write(SIDECAR_HEADER.pack(SIDECAR_MAGIC, SIDECAR_VERSION, NUM_LANDMARKS, LANDMARK_FIELDS, 0,
+                                                      self.measured_fps))
+
+    # Returns (video path, sidecar path) once everything queued is written
+    def close(self):
+        self.queue.close()
+        self.thread.join()
+        return self.video_path, self.sidecar_path
+
+
+# Read-only view of a sidecar, memory-mapped so opening a long session
+# costs nothing until frames are read. `fps` is the measured frame rate.
+class LandmarkSidecar:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            magic, version, num_landmarks, fields, _, self.fps = SIDECAR_HEADER.unpack(f.read(SIDECAR_HEADER.size))
+        if magic != SIDECAR_MAGIC or version not in (1, SIDECAR_VERSION) or (num_landmarks, fields) != (NUM_LANDMARKS, LANDMARK_FIELDS):
+            raise ValueError(f"'{path}' is not a landmark sidecar")
+        dtype = SIDECAR_RECORD if version == SIDECAR_VERSION else SIDECAR_RECORD_V1
+        # A record cut short by a crash is ignored
+        count = (os.path.getsize(path) - SIDECAR_HEADER.size) // dtype.itemsize
+        self.records = (np.memmap(path, dtype=dtype, mode='r', offset=SIDECAR_HEADER.size, shape=(count,))
+                        if count else np.zeros(0, dtype=dtype))
+
+    def __len__(self):
+        return len(self.records)
+
+    def landmarks(self, index=None):
+        if index is None:
+            return self.records['landmarks'].astype(np.float32)
+        return self.records['landmarks'][index].astype(np.float32)
+
+    def frame_numbers(self):
+        return np.asarray(self.records['frame_no'])
+
+    # Seconds from the first frame, per frame
+    def timestamps(self):
+        if 'timestamp' in self.records.dtype.names:
+            return self.records['timestamp'].astype(np.float64)
+        return np.arange(len(self.records)) / self.fps
+
+    @property
+    def duration(self):
+        return float(self.timestamps()[-1]) if len(self.records) else 0.0
+
+
+# Seekable playback of a recording with the landmarks drawn from its sidecar
+class RecordingPlayer:
+    def __init__(self, video_path, sidecar_path):
+        self.capture = cv2.VideoCapture(video_path)
+        if not self.capture.isOpened():
+            raise ValueError(f"No se pudo abrir el vídeo '{video_path}'.")
+        self.sidecar = LandmarkSidecar(sidecar_path)
+        self.position = 0
+
+    def __len__(self):
+        return len(self.sidecar)
+
+    # RGB frame `index` with its landmarks, or None past the end
+    def frame(self, index, overlay=True):
+        if index != self.position:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, index)
+        ret, frame = self.capture.read()
+        if not ret:
+            return None
+        self.position = index + 1
+        image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        if overlay and index < len(self.sidecar):
+            draw_landmark_array(image, self.sidecar.landmarks(index))
+        return image
+
+    def close(self):
+        self.capture.release()
+
+
+# (video path, sidecar path) of a patient's recordings, newest first
+def list_recordings(dni, output_dir=RECORDINGS_DIR):
+    recordings = []
+    for sidecar_path in sorted(glob.glob(os.path.join(patient_dir(dni, output_dir), '*.lmk')), reverse=True):
+        base_path = sidecar_path[:-len('.lmk')]
+        for _, extension in CODECS:
+            if os.path.exists(base_path + extension):
+                recordings.append((base_path + extension, sidecar_path))
+                break
+    return recordings
+
+
+if __name__ == '__main__':
+    # python recording.py 12345678A session.mp4  -> records a file through the pipeline
+    from pose_pipeline import PosePipeline
+    dni, source = sys.argv[1], sys.argv[2]
+    recorder = SessionRecorder(new_recording(dni), fps=cv2.VideoCapture(source).get(cv2.CAP_PROP_FPS) or 15, drop_oldest=False)
+    pipeline = PosePipeline(source, realtime=False, recorder=recorder)
+    if not pipeline.start():
+        sys.exit(pipeline.error)
+    while pipeline.get_frame() is not None:
+        pass
+    pipeline.stop()
+    if pipeline.error or recorder.error:
+        sys.exit(pipeline.error or recorder.error)
+    print(recorder.video_path, recorder.sidecar_path, recorder.frames_written, 'frames', recorder.dropped, 'dropped',
+          f'{recorder.measured_fps or recorder.fps:.1f} fps')
@@ -0,0 +1,144 @@
+import hashlib
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import pandas as pd
+
+from startup import lazy_import
+
+REPORT_CACHE_DIR = os.path.join('.cache', 'reports')
+# Rendered reports kept on disk; the oldest are removed beyond this
+MAX_REPORTS = int(os.environ.get('TECHEALTH_MAX_REPORTS', 64))
+
+
+# Content hash of a DataFrame: same rows, columns and dtypes, same key
+def dataset_key(df):
+    digest = hashlib.sha256()
+    digest.update(repr([(str(column), str(dtype)) for column, dtype in df.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def render_pygwalker(df):
+    return lazy_import('pygwalker').to_html(df)
+
+
+# Disk cache of rendered reports, addressed by the content hash of their data.
+# Renders run on one background thread; until the report for the current
+# data is ready, the last one rendered under the same name is served. Each
+# name has at most one render waiting to start: newer data replaces it, so
+# a burst of saves costs one render after the one in progress, not one each.
+# coalesce=False renders every dataset asked for, for callers whose datasets
+# belong to different users and must never be swapped for one another.
+class ReportCache:
+    def __init__(self, render=render_pygwalker, cache_dir=REPORT_CACHE_DIR, max_reports=MAX_REPORTS, coalesce=True):
+        self.render = render
+        self.cache_dir = cache_dir
+        self.max_reports = max_reports
+        self.coalesce = coalesce
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='reports')
+        self.pending = {}
+        self.queued = {}
+        self.lock = threading.Lock()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + '.html')
+
+    def latest_path(self, name):
+        return os.path.join(self.cache_dir, name + '.latest')
+
+    def read(self, key):
+        try:
+            with open(self.path(key), encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def write_atomic(self, path, content):
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def build(self, name, key, df):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            if not os.path.exists(self.path(key)):
+                self.write_atomic(self.path(key), self.render(df))
+            self.write_atomic(self.latest_path(name), key)
+            self.evict()
+        finally:
+            with self.lock:
+                self.pending.pop(key, None)
+        return key
+
+    # Runs the render waiting in `slot`, with the newest data it was given
+    def run(self, slot):
+        with self.lock:
+            name, key, df, future = self.queued.pop(slot)
+        try:
+            future.set_result(self.build(name, key, df))
+        except Exception as exc:
+            future.set_exception(exc)
+
+    # Starts rendering the report of `df` unless it is cached or already
+    # queued. The future completes with the key of the report rendered; when
+    # coalescing, that is the newest data of `name`, which may be newer than `df`.
+    def refresh(self, name, df, key=None):
+        key = key or dataset_key(df)
+        with self.lock:
+            future = self.pending.get(key)
+            if future is not None:
+                return future
+            if os.path.exists(self.path(key)):
+                future = Future()
+                future.set_result(key)
+                return future
+            slot = name if self.coalesce else (name, key)
+            waiting = self.queued.get(slot)
+            if waiting is not None:
+                self.pending.pop(waiting[1], None)
+                waiting[1], waiting[2] = key, df
+                future = waiting[3]
+            else:
+                future = Future()
+                self.queued[slot] = [name, key, df, future]
+                self.executor.submit(self.run, slot)
+            self.pending[key] = future
+        return future
+
+    # (html, fresh, future): the report for exactly this data when it is on
+    # disk, else the last report of `name` (or None) and the future of the
+    # render that was started for the new data
+    def lookup(self, name, df):
+        key = dataset_key(df)
+        html = self.read(key)
+        if html is not None:
+            try:
+                with open(self.latest_path(name), encoding='utf-8') as f:
+                    latest = f.read()
+            except FileNotFoundError:
+                latest = None
+            if latest != key:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                self.write_atomic(self.latest_path(name), key)
+            return html, True, None
+        future = self.refresh(name, df, key)
+        try:
+            with open(self.latest_path(name), encoding='utf-8') as f:
+                html = self.read(f.read())
+        except FileNotFoundError:
+            html = None
+        return html, False, future
+
+    def evict(self):
+        reports = [entry for entry in os.scandir(self.cache_dir) if entry.name.endswith('.html')]
+        if len(reports) <= self.max_reports:
+            return
+        reports.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in reports[:len(reports) - self.max_reports]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,162 @@
+import os
+import sys
+import threading
+
+import pandas as pd
+
+# Column kinds of each table. Repeated text (patients, exercises, towns) is
+# kept as categories, dates as datetime64 and numbers in the smallest dtype;
+# free text that is nearly unique per row (addresses, phones) stays string.
+MASTER_SCHEMA = {
+    'ID': 'int',
+    'Nombre': 'category',
+    'Apellidos': 'category',
+    'Direccion': 'string',
+    'DNI': 'string',
+    'Telefono': 'string',
+    'Municipio': 'category',
+    'Codigo Postal': 'category',
+}
+SCHEMAS = {
+    'datos_pacientes.xlsx': {
+        'Fecha': 'date',
+        'Nombre': 'category',
+        'DNI': 'category',
+        'Posición Corporal': 'category',
+        'Nombre Ejercicio': 'category',
+        'ID Ejercicio': 'int',
+        'Repeticiones': 'int',
+        'Tiempo (min)': 'int',
+        'Kilos': 'float',
+    },
+    'profesionales.xlsx': {**MASTER_SCHEMA, 'Tipo': 'category'},
+    'clientes.xlsx': MASTER_SCHEMA,
+}
+
+# Footprint of the last load of each table: file -> (bytes before, bytes after)
+footprints = {}
+footprints_lock = threading.Lock()
+
+
+def schema_for(file):
+    return SCHEMAS.get(os.path.basename(file))
+
+
+# Text with surrounding blanks removed and '' as missing. Numbers read from
+# Excel (phones, postcodes) lose the '.0' float suffix.
+def text(series):
+    if pd.api.types.is_float_dtype(series) and (series.dropna() % 1 == 0).all():
+        series = series.astype('Int64')
+    series = series.astype('string').str.strip()
+    return series.mask(series == '')
+
+
+# Smallest integer dtype for the values; nullable when some are missing
+# and float32 when some are not whole numbers
+def compact_number(series, kind):
+    values = pd.to_numeric(series, errors='coerce')
+    if kind == 'float' or (values.dropna() % 1 != 0).any():
+        return values.astype('float32')
+    if values.notna().all():
+        return pd.to_numeric(values.astype('int64'), downcast='integer')
+    low, high = values.min(), values.max()
+    for dtype, bits in (('Int8', 8), ('Int16', 16), ('Int32', 32)):
+        if -2 ** (bits - 1) <= low and high < 2 ** (bits - 1):
+            return values.astype(dtype)
+    return values.astype('Int64')
+
+
+def memory_bytes(df):
+    return int(df.memory_usage(deep=True).sum())
+
+
+# Compact in-memory form of a table loaded from storage. Columns outside
+# the schema are left as they are.
+def normalize(df, file):
+    schema = schema_for(file)
+    if schema is None:
+        return df
+    before = memory_bytes(df)
+    df = df.copy()
+    for column, kind in schema.items():
+        if column not in df:
+            continue
+        if kind == 'date':
+            df[column] = pd.to_datetime(df[column], errors='coerce', format='ISO8601')
+        elif kind in ('int', 'float'):
+            df[column] = compact_number(df[column], kind)
+        elif kind == 'category':
+            df[column] = text(df[column]).astype('category')
+        else:
+            df[column] = text(df[column])
+    with footprints_lock:
+        footprints[file] = (before, memory_bytes(df))
+    return df
+
+
+# Storage form of rows about to be written: ISO date text, whole numbers,
+# plain strings. Raises ValueError naming the columns (and rows) whose
+# values do not fit the schema, so nothing malformed reaches the workbook.
+def enforce(df, file):
+    schema = schema_for(file)
+    if schema is None:
+        return df
+    df = df.copy()
+    problems = []
+    for column, kind in schema.items():
+        if column not in df:
+            continue
+        series = df[column]
+        present = series.notna() & (series.astype('string').str.strip() != '')
+        if kind == 'date':
+            values = pd.to_datetime(series, errors='coerce', format='ISO8601')
+            invalid = present & values.isna()
+            df[column] = values.dt.strftime('%Y-%m-%d').astype(object).where(values.notna(), None)
+        elif kind in ('int', 'float'):
+            values = pd.to_numeric(series, errors='coerce')
+            invalid = present & values.isna()
+            if kind == 'int':
+                invalid |= values.notna() & (values % 1 != 0)
+                values = values.where(~invalid).round().astype('Int64')
+            df[column] = values
+        else:
+            values = text(series)
+            invalid = pd.Series(False, index=series.index)
+            df[column] = values.astype(object).where(values.notna(), None)
+        if invalid.any():
+            rows = ', '.join(str(row) for row in invalid[invalid].index[:10])
+            problems.append(f"{column} (filas {rows})")
+    if problems:
+        raise ValueError("Valores que no encajan en el esquema: " + '; '.join(problems))
+    return df
+
+
+# Memory of the tables loaded so far, raw versus normalized
+def memory_report():
+    with footprints_lock:
+        items = sorted(footprints.items())
+    report = pd.DataFrame([(os.path.basename(file), before / 1024, after / 1024) for file, (before, after) in items],
+                          columns=['Tabla', 'Antes (KB)', 'Después (KB)'])
+    report['Ahorro'] = (1 - report['Después (KB)'] / report['Antes (KB)']).map('{:.0%}'.format)
+    return report
+
+
+# Per-column footprint of one table, raw versus normalized
+def column_report(df, file):
+    compact = normalize(df, file)
+    report = pd.DataFrame({
+        'before_bytes': df.memory_usage(deep=True, index=False),
+        'after_bytes': compact.memory_usage(deep=True, index=False),
+        'before_dtype': df.dtypes.astype(str),
+        'after_dtype': compact.dtypes.astype(str),
+    })
+    report.loc['TOTAL', ['before_bytes', 'after_bytes']] = report[['before_bytes', 'after_bytes']].sum()
+    return report
+
+
+if __name__ == '__main__':
+    # python schemas.py datos_pacientes.xlsx clientes.xlsx
+    import storage
+    for path in sys.argv[1:]:
+        print(path)
+        print(column_report(storage.load_table(path, []), path).to_string(), end='\n\n')
@@ -0,0 +1,36 @@
+import importlib
+import sys
+import time
+
+# Process-wide timings. Streamlit re-executes the app script on every rerun
+# but imports this module only once, so these survive across reruns.
+import_times = {}
+run_times = []
+
+
+# Import a heavy module the first time a page needs it, recording how long it took
+def lazy_import(name):
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    import_times[name] = time.perf_counter() - started
+    return module
+
+
+# Time from the top of the script to page dispatch; the first run is the cold start
+def record_run(seconds, keep=100):
+    run_times.append(seconds)
+    if len(run_times) > keep:
+        del run_times[1:len(run_times) - keep + 1]
+
+
+def report():
+    return {
+        'cold_start_s': run_times[0] if run_times else None,
+        'last_rerun_s': run_times[-1] if run_times else None,
+        'mean_rerun_s': sum(run_times[1:]) / (len(run_times) - 1) if len(run_times) > 1 else None,
+        'reruns': len(run_times),
+        'imports_s': dict(import_times),
+    }
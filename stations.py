@@ -0,0 +1,272 @@
+import argparse
+import threading
+import time
+from collections import deque
+
+import cv2
+import mediapipe as mp
+
+from pose_pipeline import draw_landmark_array, landmarks_to_array, resize_for_inference
+
+
+# Pool workers take frames from any station, so the model cannot carry
+# tracking state from one frame to the next: every frame is a fresh detection
+def pool_pose():
+    return mp.solutions.pose.Pose(static_image_mode=True, min_detection_confidence=0.5)
+
+
+# Camera index as int, anything else as a file path / stream URL
+def parse_source(source):
+    source = str(source).strip()
+    return int(source) if source.isdigit() else source
+
+
+# One camera or video file. Its capture thread keeps at most `queue_size`
+# frames waiting for a worker (dropping the oldest in real time, waiting
+# otherwise); the latest annotated frame is kept for any number of viewers.
+class Station:
+    def __init__(self, name, source, service, target_fps=15, queue_size=2, realtime=True):
+        self.name = name
+        self.source = source
+        self.service = service
+        self.target_fps = target_fps
+        self.realtime = realtime
+        self.pending = deque()
+        self.queue_size = queue_size
+        self.busy = False
+        self.capture_done = False
+        self.stop_event = threading.Event()
+        self.error = None
+        self.latest = None
+        self.sequence = 0
+        self.captured = 0
+        self.processed = 0
+        self.dropped = 0
+        self.render_times = deque(maxlen=100)
+        self.latencies = deque(maxlen=100)
+        self.thread = None
+
+    def start(self):
+        self.capture = cv2.VideoCapture(parse_source(self.source))
+        if not self.capture.isOpened():
+            self.error = f"No se pudo abrir la fuente de vídeo '{self.source}'."
+            self.capture_done = True
+            return False
+        self.thread = threading.Thread(target=self.capture_loop, name=f'station-{self.name}', daemon=True)
+        self.thread.start()
+        return True
+
+    @property
+    def finished(self):
+        return self.capture_done and not self.pending and not self.busy
+
+    def capture_loop(self):
+        condition = self.service.condition
+        interval = 1.0 / self.target_fps
+        next_frame = time.perf_counter()
+        frame_no = 0
+        try:
+            while not self.stop_event.is_set():
+                ret, frame = self.capture.read()
+                if not ret:
+                    if isinstance(parse_source(self.source), int):
+                        self.error = "Error al capturar el frame de la cámara"
+                    break
+                with condition:
+                    if not self.realtime:
+                        condition.wait_for(lambda: len(self.pending) < self.queue_size or self.stop_event.is_set())
+                    if len(self.pending) >= self.queue_size:
+                        self.pending.popleft()
+                        self.dropped += 1
+                    self.pending.append((frame_no, time.perf_counter(), frame))
+                    self.captured += 1
+                    condition.notify_all()
+                frame_no += 1
+                if self.realtime:
+                    next_frame += interval
+                    time.sleep(max(0.0, next_frame - time.perf_counter()))
+        finally:
+            self.capture.release()
+            with condition:
+                self.capture_done = True
+                condition.notify_all()
+
+    # Called by a worker with the result for one of this station's frames
+    def deliver(self, frame_no, captured_at, image, landmarks):
+        now = time.perf_counter()
+        with self.service.condition:
+            self.latest = (frame_no, image, landmarks)
+            self.sequence += 1
+            self.processed += 1
+            self.render_times.append(now)
+            self.latencies.append(now - captured_at)
+            self.service.condition.notify_all()
+
+    def stats(self):
+        fps = 0.0
+        if len(self.render_times) > 1:
+            fps = (len(self.render_times) - 1) / (self.render_times[-1] - self.render_times[0])
+        return {
+            'source': str(self.source),
+            'fps': fps,
+            'latency_ms': 1000 * sum(self.latencies) / len(self.latencies) if self.latencies else 0.0,
+            'queue_depth': len(self.pending),
+            'captured': self.captured,
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'running': not self.finished,
+            'error': self.error,
+        }
+
+
+# Several stations served by one shared pool of pose workers. Workers take
+# frames round-robin over the stations with at most one frame of a station in
+# flight, so a fast camera cannot starve the others and each station's
+# results come back in order. Results are routed to their station and read
+# with wait_frame(); sources can be camera indexes or video files.
+class CaptureService:
+    def __init__(self, workers=2, pose_factory=pool_pose, inference_width=None):
+        self.workers = workers
+        self.pose_factory = pose_factory
+        self.inference_width = inference_width
+        self.condition = threading.Condition()
+        self.stations = {}
+        self.cursor = 0
+        self.stopped = False
+        self.error = None
+        self.threads = []
+
+    def start(self):
+        for number in range(self.workers):
+            thread = threading.Thread(target=self.worker_loop, name=f'pose-worker-{number}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def add_station(self, name, source, target_fps=15, queue_size=2, realtime=True):
+        station = Station(name, source, self, target_fps, queue_size, realtime)
+        with self.condition:
+            if name in self.stations:
+                raise ValueError(f"Station '{name}' already exists")
+            self.stations[name] = station
+        station.start()
+        return station
+
+    def remove_station(self, name):
+        with self.condition:
+            station = self.stations.pop(name, None)
+            if station is not None:
+                station.stop_event.set()
+                station.pending.clear()
+            self.condition.notify_all()
+        if station is not None and station.thread is not None:
+            station.thread.join(timeout=2)
+
+    def stop(self):
+        for name in list(self.stations):
+            self.remove_station(name)
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join(timeout=2)
+
+    @property
+    def running(self):
+        return any(thread.is_alive() for thread in self.threads)
+
+    # Next (station, frame) in round-robin order, or None once stopped
+    def next_job(self):
+        with self.condition:
+            while not self.stopped:
+                stations = list(self.stations.values())
+                for offset in range(len(stations)):
+                    station = stations[(self.cursor + offset) % len(stations)]
+                    if station.pending and not station.busy:
+                        self.cursor = (self.cursor + offset + 1) % len(stations)
+                        station.busy = True
+                        item = station.pending.popleft()
+                        self.condition.notify_all()
+                        return station, item
+                self.condition.wait()
+            return None
+
+    def worker_loop(self):
+        try:
+            pose = self.pose_factory()
+        except Exception as exc:
+            self.error = f"Error al cargar el modelo de pose: {exc}"
+            return
+        try:
+            while True:
+                job = self.next_job()
+                if job is None:
+                    break
+                station, (frame_no, captured_at, frame) = job
+                try:
+                    image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                    results = pose.process(resize_for_inference(image, self.inference_width))
+                    landmarks = landmarks_to_array(results.pose_landmarks)
+                    draw_landmark_array(image, landmarks)
+                    station.deliver(frame_no, captured_at, image, landmarks)
+                except Exception as exc:
+                    station.error = f"Error en la estimación de pose: {exc}"
+                finally:
+                    with self.condition:
+                        station.busy = False
+                        self.condition.notify_all()
+        finally:
+            pose.close()
+
+    # Latest annotated frame of a station newer than `after` (a sequence
+    # number from a previous call), as (sequence, frame_no, image, landmarks);
+    # None on timeout or when the station has finished
+    def wait_frame(self, name, after=0, timeout=None):
+        with self.condition:
+            station = self.stations.get(name)
+            if station is None:
+                return None
+            ready = self.condition.wait_for(
+                lambda: station.sequence > after or station.finished or name not in self.stations, timeout)
+            if not ready or station.sequence <= after:
+                return None
+            return (station.sequence,) + station.latest
+
+    def stats(self):
+        with self.condition:
+            return {name: station.stats() for name, station in self.stations.items()}
+
+    # Per-station gauges for the Prometheus export
+    def publish(self, registry):
+        for name, stats in self.stats().items():
+            registry.set_gauge('techealth_station_fps', round(stats['fps'], 2), station=name)
+            registry.set_gauge('techealth_station_queue_depth', stats['queue_depth'], station=name)
+            registry.set_gauge('techealth_station_dropped_frames', stats['dropped'], station=name)
+            registry.set_gauge('techealth_station_latency_ms', round(stats['latency_ms'], 1), station=name)
+
+
+if __name__ == '__main__':
+    # python stations.py a.mp4 b.mp4 0 --workers 2  -> video files stand in for cameras
+    parser = argparse.ArgumentParser(description="Servicio de captura multi-estación con un pool de pose compartido")
+    parser.add_argument('sources', nargs='+', help="índices de cámara o rutas de vídeo")
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--fps', type=int, default=15)
+    parser.add_argument('--offline', action='store_true', help="procesar los archivos sin perder frames, tan rápido como se pueda")
+    args = parser.parse_args()
+
+    service = CaptureService(workers=args.workers)
+    service.start()
+    for number, source in enumerate(args.sources, 1):
+        service.add_station(f'estacion-{number}', source, target_fps=args.fps, realtime=not args.offline)
+    started = time.perf_counter()
+    while service.running and any(stats['running'] for stats in service.stats().values()):
+        time.sleep(1.0)
+        for name, stats in service.stats().items():
+            print(f"{name}: {stats['fps']:5.1f} FPS  cola {stats['queue_depth']}  procesados {stats['processed']}"
+                  f"  descartados {stats['dropped']}  latencia {stats['latency_ms']:.0f} ms")
+    final = service.stats()
+    service.stop()
+    print(f'{time.perf_counter() - started:.1f} s')
+    for name, stats in final.items():
+        print(name, stats)
+    if service.error:
+        raise SystemExit(service.error)
@@ -0,0 +1,409 @@
+import os
+import sqlite3
+import sys
+import tempfile
+from contextlib import closing, contextmanager
+from io import BytesIO
+
+import pandas as pd
+
+from cache import file_signature
+
+# Backend de almacenamiento: 'sqlite' (por defecto) o 'excel' (comportamiento original)
+STORAGE_BACKEND = os.environ.get('TECHEALTH_STORAGE', 'sqlite')
+DB_FILE = os.environ.get('TECHEALTH_DB', 'techealth.db')
+
+
+# Each workbook maps to a table named after the file (datos_pacientes.xlsx -> datos_pacientes)
+def table_name(file):
+    return os.path.splitext(os.path.basename(file))[0]
+
+
+def quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+# Cross-process exclusive lock held on '<path>.lock' while the block runs
+@contextmanager
+def file_lock(path):
+    with open(path + '.lock', 'a+') as handle:
+        if os.name == 'nt':
+            import msvcrt
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+
+# Write to a temporary file next to the target and rename it into place,
+# so readers never see a half-written workbook
+def atomic_to_excel(df, file):
+    directory = os.path.dirname(os.path.abspath(file))
+    fd, tmp = tempfile.mkstemp(suffix='.xlsx', dir=directory)
+    os.close(fd)
+    try:
+        df.to_excel(tmp, index=False)
+        os.replace(tmp, file)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+# Raises ValueError if any of the new IDs is already taken
+def check_ids_free(new_ids, existing_ids):
+    taken = set(pd.to_numeric(pd.Series(list(existing_ids), dtype=object), errors='coerce').dropna().astype(int))
+    clashes = sorted(set(int(value) for value in new_ids) & taken)
+    if clashes:
+        raise ValueError(f"IDs already in use: {', '.join(map(str, clashes[:20]))}")
+
+
+def max_id(df, id_column):
+    if id_column not in df.columns:
+        return 0
+    last = pd.to_numeric(df[id_column], errors='coerce').max()
+    return 0 if pd.isna(last) else int(last)
+
+
+# In-memory equivalent of SQLiteBackend.query_page, for the Excel backend.
+# equals: {column: value} (case-insensitive), isin: {column: values},
+# between: {column: (low, high)} with None for an open end.
+def filter_page(df, equals=None, isin=None, between=None, sort_by=None, ascending=True, offset=0, limit=50):
+    mask = pd.Series(True, index=df.index)
+    for column, value in (equals or {}).items():
+        if column not in df:
+            return df.iloc[:0], 0
+        mask &= df[column].astype(str).str.lower() == str(value).lower()
+    for column, values in (isin or {}).items():
+        if values and column in df:
+            mask &= df[column].isin(list(values))
+    for column, (low, high) in (between or {}).items():
+        if column in df:
+            if low is not None:
+                mask &= df[column].astype(str) >= str(low)
+            if high is not None:
+                mask &= df[column].astype(str) <= str(high)
+    filtered = df[mask]
+    if sort_by in filtered:
+        filtered = filtered.sort_values(sort_by, ascending=ascending, kind='stable')
+    return filtered.iloc[offset:offset + limit], len(filtered)
+
+
+# Original behaviour: every save rewrites the whole workbook
+class ExcelBackend:
+    def load(self, file, columns):
+        if os.path.exists(file):
+            return pd.read_excel(file)
+        return pd.DataFrame(columns=columns)
+
+    def save(self, df, file):
+        with file_lock(file):
+            atomic_to_excel(df, file)
+
+    def append(self, df, file, id_column=None, keep_ids=False):
+        with file_lock(file):
+            before = file_signature(file)
+            current = self.load(file, df.columns)
+            if id_column and keep_ids:
+                check_ids_free(df[id_column], current[id_column] if id_column in current else [])
+            elif id_column:
+                first = max_id(current, id_column) + 1
+                df = df.assign(**{id_column: range(first, first + len(df))})
+            atomic_to_excel(pd.concat([current, df], ignore_index=True), file)
+            after = file_signature(file)
+        return df, before, after
+
+    def peek_next_id(self, file, id_column):
+        return max_id(self.load(file, [id_column]), id_column) + 1
+
+    def signature(self, file):
+        return file_signature(file)
+
+    def query_page(self, file, columns, **query):
+        return filter_page(self.load(file, columns), **query)
+
+
+# Embedded SQLite store: appending a session is a single INSERT
+class SQLiteBackend:
+    def __init__(self, db_file=DB_FILE):
+        self.db_file = db_file
+
+    def connect(self):
+        con = sqlite3.connect(self.db_file, timeout=30)
+        con.execute('PRAGMA journal_mode=WAL')
+        return con
+
+    def has_table(self, con, table):
+        row = con.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone()
+        return row is not None
+
+    def table_columns(self, con, table):
+        return [row[1] for row in con.execute(f'PRAGMA table_info({quote(table)})')]
+
+    # One-time import of the existing workbook the first time a table is used
+    def ensure_imported(self, con, file):
+        table = table_name(file)
+        if self.has_table(con, table) or not os.path.exists(file):
+            return
+        with file_lock(self.db_file):
+            if not self.has_table(con, table):
+                df = pd.read_excel(file)
+                with self.transaction(con):
+                    self.write_rows(con, table, df, replace=True)
+
+    # BEGIN IMMEDIATE takes SQLite's write lock up front, so concurrent
+    # sessions queue on the database instead of overwriting each other.
+    # Everything written inside, including the version bump, commits or
+    # rolls back together (pandas' to_sql would commit on its own, so rows
+    # are written with write_rows instead).
+    @contextmanager
+    def transaction(self, con):
+        con.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+            con.commit()
+        except BaseException:
+            con.rollback()
+            raise
+
+    # Creates the table (replacing it if asked), adds missing columns and
+    # inserts the rows, then bumps the table's version. Dates are stored as
+    # text in the form pandas used for the first imports.
+    def write_rows(self, con, table, df, replace=False):
+        if replace:
+            con.execute(f'DROP TABLE IF EXISTS {quote(table)}')
+        if not self.has_table(con, table):
+            con.execute(f'CREATE TABLE {quote(table)} ({", ".join(quote(column) for column in df.columns)})')
+        else:
+            existing = self.table_columns(con, table)
+            for column in df.columns:
+                if column not in existing:
+                    con.execute(f'ALTER TABLE {quote(table)} ADD COLUMN {quote(column)}')
+        if len(df):
+            values = df.copy()
+            for column in values.columns:
+                if pd.api.types.is_datetime64_any_dtype(values[column]):
+                    values[column] = values[column].dt.strftime('%Y-%m-%d %H:%M:%S')
+            values = values.astype(object).where(values.notna(), None)
+            columns = ', '.join(quote(column) for column in df.columns)
+            placeholders = ', '.join('?' for _ in df.columns)
+            con.executemany(f'INSERT INTO {quote(table)} ({columns}) VALUES ({placeholders})',
+                            values.itertuples(index=False, name=None))
+        self.bump_version(con, table)
+
+    # Per-table change counter, bumped inside every write transaction so a
+    # cached copy of one table is only invalidated by writes to that table
+    def bump_version(self, con, table):
+        con.execute('CREATE TABLE IF NOT EXISTS _table_versions (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        con.execute('INSERT INTO _table_versions (name, value) VALUES (?, 1) '
+                    'ON CONFLICT (name) DO UPDATE SET value = value + 1', (table,))
+
+    def table_version(self, con, table):
+        if not self.has_table(con, '_table_versions'):
+            return 0
+        row = con.execute('SELECT value FROM _table_versions WHERE name = ?', (table,)).fetchone()
+        return row[0] if row else 0
+
+    # Monotonic ID sequence per table, seeded from the highest existing ID.
+    # Must run inside the caller's write transaction.
+    def next_ids(self, con, table, id_column, count):
+        con.execute('CREATE TABLE IF NOT EXISTS _id_sequences (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        last = self.last_id(con, table, id_column)
+        con.execute('INSERT OR REPLACE INTO _id_sequences (name, value) VALUES (?, ?)', (table, last + count))
+        return range(last + 1, last + count + 1)
+
+    # Moves the sequence past IDs that were supplied explicitly (bulk imports)
+    def reserve_ids(self, con, table, id_column, new_ids):
+        con.execute('CREATE TABLE IF NOT EXISTS _id_sequences (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        existing = []
+        if self.has_table(con, table) and id_column in self.table_columns(con, table):
+            existing = [row[0] for row in con.execute(f'SELECT DISTINCT {quote(id_column)} FROM {quote(table)}')]
+        check_ids_free(new_ids, existing)
+        last = max([self.last_id(con, table, id_column)] + [int(value) for value in new_ids])
+        con.execute('INSERT OR REPLACE INTO _id_sequences (name, value) VALUES (?, ?)', (table, last))
+
+    def last_id(self, con, table, id_column):
+        if self.has_table(con, '_id_sequences'):
+            row = con.execute('SELECT value FROM _id_sequences WHERE name = ?', (table,)).fetchone()
+            if row is not None:
+                return row[0]
+        if self.has_table(con, table) and id_column in self.table_columns(con, table):
+            last = con.execute(f'SELECT MAX(CAST({quote(id_column)} AS INTEGER)) FROM {quote(table)}').fetchone()[0]
+            return last or 0
+        return 0
+
+    def load(self, file, columns):
+        with closing(self.connect()) as con:
+            self.ensure_imported(con, file)
+            table = table_name(file)
+            if not self.has_table(con, table):
+                return pd.DataFrame(columns=columns)
+            return pd.read_sql_query(f'SELECT * FROM {quote(table)}', con)
+
+    def save(self, df, file):
+        with closing(self.connect()) as con, self.transaction(con):
+            self.write_rows(con, table_name(file), df, replace=True)
+
+    # Schema changes, ID allocation, rows and version bump in one transaction
+    def append(self, df, file, id_column=None, keep_ids=False):
+        with closing(self.connect()) as con:
+            self.ensure_imported(con, file)
+            table = table_name(file)
+            with self.transaction(con):
+                before = self.table_signature(con, file)
+                if id_column and keep_ids:
+                    self.reserve_ids(con, table, id_column, df[id_column])
+                elif id_column:
+                    df = df.assign(**{id_column: self.next_ids(con, table, id_column, len(df))})
+                self.write_rows(con, table, df)
+                after = self.table_signature(con, file)
+        return df, before, after
+
+    def peek_next_id(self, file, id_column):
+        with closing(self.connect()) as con:
+            self.ensure_imported(con, file)
+            return self.last_id(con, table_name(file), id_column) + 1
+
+    def ensure_index(self, con, table, column):
+        name = quote(f'idx_{table}_{column}')
+        con.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {quote(table)} ({quote(column)} COLLATE NOCASE)')
+        con.commit()
+
+    # One page of filtered, sorted rows plus the total number of matches,
+    # computed in SQL so only the visible rows are read (see filter_page)
+    def query_page(self, file, columns, equals=None, isin=None, between=None, sort_by=None, ascending=True,
+                   offset=0, limit=50):
+        with closing(self.connect()) as con:
+            self.ensure_imported(con, file)
+            table = table_name(file)
+            if not self.has_table(con, table):
+                return pd.DataFrame(columns=columns), 0
+            existing = self.table_columns(con, table)
+            where, params = [], []
+            for column, value in (equals or {}).items():
+                if column not in existing:
+                    return pd.DataFrame(columns=existing), 0
+                self.ensure_index(con, table, column)
+                where.append(f'{quote(column)} = ? COLLATE NOCASE')
+                params.append(value)
+            for column, values in (isin or {}).items():
+                if values and column in existing:
+                    where.append(f'{quote(column)} IN ({", ".join("?" * len(values))})')
+                    params.extend(values)
+            for column, (low, high) in (between or {}).items():
+                if column in existing:
+                    if low is not None:
+                        where.append(f'{quote(column)} >= ?')
+                        params.append(low)
+                    if high is not None:
+                        where.append(f'{quote(column)} <= ?')
+                        params.append(high)
+            clause = ' WHERE ' + ' AND '.join(where) if where else ''
+            total = con.execute(f'SELECT COUNT(*) FROM {quote(table)}{clause}', params).fetchone()[0]
+            order = f' ORDER BY {quote(sort_by)} {"ASC" if ascending else "DESC"}' if sort_by in existing else ''
+            page = pd.read_sql_query(f'SELECT * FROM {quote(table)}{clause}{order} LIMIT ? OFFSET ?', con,
+                                     params=params + [limit, offset])
+            return page, total
+
+    # Version of one table: the database file's identity (a recreated
+    # database starts counting again) plus the table's change counter.
+    # The workbook is imported first, so a copy loaded right after is stamped
+    # with the same version as the table; with nothing to import (no table,
+    # no workbook) the workbook's own signature stands in.
+    def signature(self, file):
+        with closing(self.connect()) as con:
+            self.ensure_imported(con, file)
+            return self.table_signature(con, file)
+
+    def table_signature(self, con, file):
+        table = table_name(file)
+        if not self.has_table(con, table):
+            return file_signature(file)
+        return (self.db_file, os.stat(self.db_file).st_ino, table, self.table_version(con, table))
+
+
+def get_backend(name=STORAGE_BACKEND):
+    if name == 'excel':
+        return ExcelBackend()
+    if name == 'sqlite':
+        return SQLiteBackend()
+    raise ValueError(f"Unknown storage backend '{name}'")
+
+
+backend = get_backend()
+
+
+def load_table(file, columns):
+    return backend.load(file, columns)
+
+
+def save_table(df, file):
+    backend.save(df, file)
+
+
+# Returns (appended rows, signature of the table just before the write,
+# signature just after it): a cached copy stamped with the first one had
+# every earlier row and can take the new ones in place. With id_column,
+# IDs are allocated for the new rows, or with keep_ids=True the given IDs
+# are kept (ValueError if taken).
+def append_rows(df, file, id_column=None, keep_ids=False):
+    return backend.append(df, file, id_column, keep_ids)
+
+
+# ID the next appended row will probably get (for display only; the real
+# one is allocated inside append_rows)
+def peek_next_id(file, id_column='ID'):
+    return backend.peek_next_id(file, id_column)
+
+
+# (rows, total) for one page of a filtered, sorted table
+def query_page(file, columns, **query):
+    return backend.query_page(file, columns, **query)
+
+
+# Changes whenever the stored table may have changed (used as cache key)
+def signature(file):
+    return backend.signature(file)
+
+
+# Export path for staff who still work with the workbooks
+def export_excel_bytes(file, columns):
+    buffer = BytesIO()
+    load_table(file, columns).to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+
+def export_to_excel(file, columns, target=None):
+    target = target or file
+    with file_lock(target):
+        atomic_to_excel(load_table(file, columns), target)
+
+
+# Importa (o reimporta) los libros Excel al almacén
+def import_excel(files, replace=False):
+    for file in files:
+        if replace:
+            save_table(pd.read_excel(file), file)
+        else:
+            load_table(file, [])
+
+
+if __name__ == '__main__':
+    # python storage.py import|export file1.xlsx file2.xlsx ...
+    command, files = sys.argv[1], sys.argv[2:]
+    if command == 'import':
+        import_excel(files, replace=True)
+    elif command == 'export':
+        for file in files:
+            export_to_excel(file, [])
+    else:
+        sys.exit(f"Unknown command '{command}'")
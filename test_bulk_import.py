@@ -0,0 +1,71 @@
+import pandas as pd
+
+import bulk_import
+
+
+def sessions(**columns):
+    rows = {
+        'Fecha': ['2024-07-24', '25/07/2024'],
+        'Nombre': ['John Doe', 'Ana'],
+        'DNI': ['12345678Z', 'x1234567l'],
+        'Posición Corporal': ['SUPINO', 'SUPINO'],
+        'Nombre Ejercicio': ['Puente', 'Puente'],
+        'Repeticiones': ['10', '12'],
+        'Tiempo (min)': ['5', '6'],
+        'Kilos': ['2,5', ''],
+    }
+    rows.update(columns)
+    return pd.DataFrame(rows)
+
+
+def test_valid_dni_checks_the_letter():
+    values = pd.Series(['12345678Z', '12345678A', 'X1234567L', 'X1234567Z', '1234567Z', 'X12345678L', ''])
+    assert bulk_import.valid_dni(values).tolist() == [True, False, True, False, False, False, False]
+
+
+def test_valid_batch_is_converted():
+    rows, errors = bulk_import.validate_batch(sessions(), 'sesiones')
+    assert errors.empty
+    assert rows['DNI'].tolist() == ['12345678Z', 'X1234567L']
+    assert rows['Fecha'].tolist() == ['2024-07-24', '2024-07-25']
+    assert rows['Kilos'].tolist() == [2.5, 0]
+
+
+def test_errors_point_at_spreadsheet_rows():
+    batch = sessions(DNI=['12345678Z', '12345678A'], Repeticiones=['10', '2,5'], Kilos=['abc', '900'])
+    _, errors = bulk_import.validate_batch(batch, 'sesiones')
+    # Row 1 of the sheet is the header, so the first data row is row 2
+    assert errors.to_dict('records') == [
+        {'Fila': 2, 'Columna': 'Kilos', 'Error': 'No es un número'},
+        {'Fila': 3, 'Columna': 'DNI', 'Error': 'DNI/NIE no válido'},
+        {'Fila': 3, 'Columna': 'Kilos', 'Error': 'Fuera de rango (0-500)'},
+        {'Fila': 3, 'Columna': 'Repeticiones', 'Error': 'Debe ser un número entero'},
+    ]
+
+
+def test_missing_required_column_is_reported_once():
+    rows, errors = bulk_import.validate_batch(sessions().drop(columns=['Fecha']), 'sesiones')
+    assert rows.empty
+    assert errors.to_dict('records') == [{'Fila': 1, 'Columna': 'Fecha', 'Error': 'Columna obligatoria ausente'}]
+
+
+def test_unknown_exercise_for_position():
+    catalogue = pd.DataFrame({'POSICIÓN CORPORAL': ['SUPINO'], 'NOMBRE EJERCICIO': ['Puente']})
+    batch = sessions(**{'Posición Corporal': ['SUPINO', 'SEDESTACIÓN']})
+    _, errors = bulk_import.validate_batch(batch, 'sesiones', catalogue=catalogue)
+    assert errors[['Fila', 'Columna']].values.tolist() == [[3, 'Nombre Ejercicio']]
+
+
+def test_master_duplicates_in_batch_and_storage():
+    batch = pd.DataFrame({
+        'Nombre': ['A', 'B', 'C'],
+        'Apellidos': ['X', 'Y', 'Z'],
+        'DNI': ['12345678Z', '12345678z', 'X1234567L'],
+    })
+    existing = pd.DataFrame({'ID': [1], 'DNI': ['x1234567l']})
+    _, errors = bulk_import.validate_batch(batch, 'clientes', existing=existing)
+    assert errors[['Fila', 'Error']].values.tolist() == [
+        [2, 'DNI repetido en el lote'],
+        [3, 'DNI repetido en el lote'],
+        [4, 'DNI ya registrado'],
+    ]
@@ -0,0 +1,40 @@
+import pandas as pd
+
+from cache import TableCache
+
+
+class Rows:
+    def __init__(self):
+        self.rows = []
+
+    def add_rows(self, rows):
+        self.rows.extend(rows)
+
+
+def test_apply_write_updates_entries_current_before_the_write():
+    cache = TableCache()
+    index = cache.get(('index', 'f.xlsx', 'ID'), 'v1', Rows)
+    cache.get(('table', 'f.xlsx'), 'v1', pd.DataFrame)
+    cache.apply_write('f.xlsx', 'v1', 'v2', [1])
+    assert index.rows == [1]
+    assert cache.peek(('index', 'f.xlsx', 'ID'), 'v2') is index
+    # Plain DataFrames cannot take rows in place
+    assert cache.peek(('table', 'f.xlsx'), 'v2') is None
+
+
+def test_apply_write_drops_entries_that_were_already_stale():
+    cache = TableCache()
+    index = cache.get(('index', 'f.xlsx', 'ID'), 'v1', Rows)
+    # Someone else wrote v2; our write went from v2 to v3
+    cache.apply_write('f.xlsx', 'v2', 'v3', [1])
+    assert index.rows == []
+    assert cache.peek(('index', 'f.xlsx', 'ID'), 'v3') is None
+    assert cache.get(('index', 'f.xlsx', 'ID'), 'v3', Rows) is not index
+
+
+def test_other_files_are_untouched():
+    cache = TableCache()
+    other = cache.get(('index', 'g.xlsx', 'ID'), 'g1', Rows)
+    cache.apply_write('f.xlsx', 'v1', 'v2', [1])
+    assert cache.peek(('index', 'g.xlsx', 'ID'), 'g1') is other
+    assert other.rows == []
@@ -0,0 +1,28 @@
+import numpy as np
+
+from pose_metrics import LandmarkBuffer, count_repetitions
+
+
+def test_counts_full_cycles():
+    angles = 90 - 80 * np.cos(np.linspace(0, 2 * np.pi * 5, 500))
+    assert count_repetitions(angles) == 5
+
+
+def test_jitter_around_one_threshold_is_not_counted():
+    angles = np.array([0, 100] + [50, 52] * 20 + [0], dtype=float)
+    assert count_repetitions(angles) == 1
+
+
+def test_missing_frames_are_skipped():
+    angles = np.array([0, np.nan, 100, np.nan, 0, 100, 0], dtype=float)
+    assert count_repetitions(angles) == 2
+    assert count_repetitions(np.array([np.nan, 10.0])) == 0
+
+
+def test_buffer_window_wraps_in_order():
+    buffer = LandmarkBuffer(capacity=3)
+    for value in range(5):
+        buffer.slot()[:] = value
+        buffer.commit()
+    assert buffer.window()[:, 0, 0].tolist() == [2, 3, 4]
+    assert buffer.window(2)[:, 0, 0].tolist() == [3, 4]
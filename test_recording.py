@@ -0,0 +1,42 @@
+import numpy as np
+
+import recording
+
+
+def test_sidecar_keeps_capture_times_and_measured_fps(tmp_path):
+    recorder = recording.SessionRecorder(str(tmp_path / 'session'), fps=15, drop_oldest=False)
+    frame = np.zeros((24, 32, 3), dtype=np.uint8)
+    for frame_no, captured_at in [(0, 10.0), (1, 10.1), (5, 10.5)]:
+        landmarks = np.full((recording.NUM_LANDMARKS, recording.LANDMARK_FIELDS), frame_no, dtype=np.float32)
+        recorder.put(frame_no, frame, landmarks, captured_at)
+    video_path, sidecar_path = recorder.close()
+    assert recorder.error is None and video_path is not None
+
+    sidecar = recording.LandmarkSidecar(sidecar_path)
+    assert len(sidecar) == 3
+    assert sidecar.frame_numbers().tolist() == [0, 1, 5]
+    assert np.allclose(sidecar.timestamps(), [0.0, 0.1, 0.5], atol=1e-5)
+    assert sidecar.fps == np.float32(4.0)
+    assert sidecar.landmarks(2)[0].tolist() == [5, 5, 5, 5]
+
+
+def test_version_1_sidecar_is_evenly_spaced(tmp_path):
+    path = tmp_path / 'old.lmk'
+    header = recording.SIDECAR_HEADER.pack(recording.SIDECAR_MAGIC, 1, recording.NUM_LANDMARKS,
+                                           recording.LANDMARK_FIELDS, 0, 10.0)
+    path.write_bytes(header + np.zeros(4, dtype=recording.SIDECAR_RECORD_V1).tobytes() + b'\0' * 7)
+    sidecar = recording.LandmarkSidecar(str(path))
+    assert len(sidecar) == 4
+    assert np.allclose(sidecar.timestamps(), [0.0, 0.1, 0.2, 0.3])
+    assert np.isclose(sidecar.duration, 0.3)
+
+
+def test_other_files_are_rejected(tmp_path):
+    path = tmp_path / 'bad.lmk'
+    path.write_bytes(b'\0' * 64)
+    try:
+        recording.LandmarkSidecar(str(path))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('expected ValueError')